@@ -1,2 +1,10 @@
 from .calculate import *
 from .constants import *
+from .data_handlers import get_registry
+
+
+def __getattr__(name):
+    # Factor tables are shared by all modules and only loaded on first use
+    if name in ("emission_factors", "conversion_factors"):
+        return getattr(get_registry(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -7,14 +7,41 @@ from typing import Optional
 
 from pydantic import BaseModel
 
+from co2calculator.parameters import ParameterRecord
+
+
+class _ParametersField:
+    """Field of the emission parameters, which are held as compact record and
+    converted to their parameter class on first access"""
+
+    def __set_name__(self, owner, name):
+        self._attribute = f"_{name}"
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            # The field has no default
+            raise AttributeError(self._attribute[1:])
+        parameters = getattr(instance, self._attribute)
+        if isinstance(parameters, ParameterRecord):
+            parameters = parameters.to_model()
+            setattr(instance, self._attribute, parameters)
+        return parameters
+
+    def __set__(self, instance, parameters):
+        setattr(instance, self._attribute, parameters)
+
 
 @dataclass
 class Emissions:
-    """Class for storing information on emissions"""
+    """Class for storing information on emissions
+
+    Emission parameters given as record (see ParameterRecord) are returned as
+    instance of their parameter class.
+    """
 
     co2e: float
     emission_factor: float
-    emission_parameters: BaseModel | dict
+    emission_parameters: BaseModel | dict = _ParametersField()
 
     def __post_init__(self):
         """Validate the attribute values"""
@@ -8,10 +8,10 @@ from co2calculator import ConversionFactors
 
 from co2calculator.energy.calculate_energy import (
     calc_co2_electricity,
-    calc_co2_heating,
+    calc_co2_heating_with_unit,
 )
 from co2calculator.api.emission import EnergyEmissions
-from co2calculator.energy.calculate_energy import conversion_factors
+from co2calculator.parameters import HeatingResultRecord
 
 
 class Energy:
@@ -179,17 +179,14 @@ class _EnergyFromHeating(Energy):
         # Filter out items where value is None
         options = {k: v for k, v in options.items() if v is not None}
 
-        co2e, emission_factor, emission_parameters = calc_co2_heating(
+        co2e, emission_factor, emission_parameters, unit = calc_co2_heating_with_unit(
             self.consumption, options=options
         )
-        # Get the unit
-        if self.in_kwh:
-            unit = "kWh"
-        else:
-            unit = conversion_factors.get_unit()
 
         # Remove in_kwh from emission_parameters to avoid repetition in output
-        delattr(emission_parameters, "in_kwh")
+        emission_parameters = HeatingResultRecord(
+            *(getattr(emission_parameters, f) for f in HeatingResultRecord._fields)
+        )
 
         emissions = EnergyEmissions(
             co2e=co2e,
@@ -15,7 +15,12 @@ from co2calculator.mobility.calculate_mobility import (
     calc_co2_bicycle,
     calc_co2_pedelec,
 )
-from co2calculator.constants import TransportationMode
+from co2calculator.data_handlers import get_registry
+from co2calculator.constants import (
+    BusTrainRange,
+    TransportationMode,
+    canonical_country_code,
+)
 
 
 class Trip:
@@ -67,7 +72,7 @@ class Trip:
 
         # get coordinates
         self._start_coords = coords[0]
-        self._destination_coords = coords[1]
+        self._destination_coords = coords[-1]
 
         return self.distance
 
@@ -212,6 +217,25 @@ class Trip:
             destination=self.destination,
         )
 
+    def _options(self, **parameters) -> dict:
+        """Returns the valid values of trip parameters, given the values of the others
+
+        Values are compared in lower case, like the parameter models do, except for
+        country codes.
+
+        :return: Sorted valid values, keyed by parameter
+        :rtype: dict
+        """
+        given = {
+            parameter: value.lower()
+            if isinstance(value, str) and parameter != "country_code"
+            else value
+            for parameter, value in parameters.items()
+        }
+        catalogue = get_registry().emission_factors.catalogues["transport"]
+        options = catalogue.options(subcategory=self.transportation_mode, **given)
+        return {parameter: options.get(parameter, []) for parameter in parameters}
+
 
 class _TripByCar(Trip):
     """
@@ -288,19 +312,8 @@ class _TripByCar(Trip):
 
         :return: Dictionary of available options
         """
-        options = {
-            "fuel_type": [
-                "gasoline",
-                "diesel",
-                "electric",
-                "hybrid",
-                "plug-in_hybrid",
-                "cng",
-                "average",
-            ],
-            "size": ["small", "medium", "large", "average"],
-            "passengers": "Enter the number of passengers (default is 1)",
-        }
+        options = self._options(fuel_type=self.fuel_type, size=self.size)
+        options["passengers"] = "Enter the number of passengers (default is 1)"
         return options
 
 
@@ -344,6 +357,10 @@ class _TripByTrain(Trip):
 
         # Calculate emissions
         options = {"country_code": self.country_code}
+        # Country specific emission factors are only available for the average range
+        if self.country_code not in (None, "global"):
+            options["country_code"] = canonical_country_code(self.country_code)
+            options["vehicle_range"] = BusTrainRange.AVERAGE
         # Filter out items where value is None
         options = {k: v for k, v in options.items() if v is not None}
 
@@ -363,8 +380,14 @@ class _TripByTrain(Trip):
         return emissions
 
     def get_options(self):
-        # TODO: Implement options retrieval
-        pass
+        """Return available options for train trips.
+
+        :return: Dictionary of available options
+        """
+        country_code = self.country_code
+        if country_code not in (None, "global"):
+            country_code = canonical_country_code(country_code)
+        return self._options(vehicle_range=None, country_code=country_code)
 
 
 class _TripByPlane(Trip):
@@ -425,8 +448,11 @@ class _TripByPlane(Trip):
         return emissions
 
     def get_options(self):
-        # TODO: Implement options retrieval
-        pass
+        """Return available options for plane trips.
+
+        :return: Dictionary of available options
+        """
+        return self._options(seating=self.seating)
 
 
 class _TripByTram(Trip):
@@ -476,8 +502,11 @@ class _TripByTram(Trip):
         return emissions
 
     def get_options(self):
-        # TODO: Implement options retrieval
-        pass
+        """Return available options for tram trips.
+
+        :return: Dictionary of available options (there are none for tram trips)
+        """
+        return {}
 
 
 # class _TripByFerry(Trip):
@@ -606,8 +635,13 @@ class _TripByBus(Trip):
         return emissions
 
     def get_options(self):
-        # TODO: Implement options retrieval
-        pass
+        """Return available options for bus trips.
+
+        :return: Dictionary of available options
+        """
+        return self._options(
+            fuel_type=self.fuel_type, size=self.size, vehicle_range=self.vehicle_range
+        )
 
 
 class _TripByMotorbike(Trip):
@@ -668,8 +702,11 @@ class _TripByMotorbike(Trip):
         return emissions
 
     def get_options(self):
-        # TODO: Implement options retrieval
-        pass
+        """Return available options for motorbike trips.
+
+        :return: Dictionary of available options
+        """
+        return self._options(size=self.size)
 
 
 class _TripByBicycle(Trip):
@@ -721,8 +758,11 @@ class _TripByBicycle(Trip):
         return emissions
 
     def get_options(self):
-        # TODO: Implement options retrieval
-        pass
+        """Return available options for bicycle trips.
+
+        :return: Dictionary of available options (there are none for bicycle trips)
+        """
+        return {}
 
 
 class _TripByPedelec(Trip):
@@ -774,8 +814,11 @@ class _TripByPedelec(Trip):
         return emissions
 
     def get_options(self):
-        # TODO: Implement options retrieval
-        pass
+        """Return available options for pedelec trips.
+
+        :return: Dictionary of available options (there are none for pedelec trips)
+        """
+        return {}
 
 
 class _TripCustom(Trip):
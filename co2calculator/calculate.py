@@ -30,9 +30,6 @@ from .distances import create_distance_request, get_distance, range_categories
 
 script_path = str(Path(__file__).parent)
 
-emission_factors = EmissionFactors()
-conversion_factors = ConversionFactors()
-
 
 def calc_co2_commuting(
     transportation_mode: TransportationMode,
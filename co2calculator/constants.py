@@ -3,14 +3,38 @@
 """Constant variables and enums"""
 
 import enum
+from types import MappingProxyType
 
 import iso3166
-from co2calculator.data_handlers import Airports
+from co2calculator.data_handlers import get_airports
 
 from dataclasses import dataclass
 
 KWH_TO_TJ = 277777.77777778
 
+# Country codes of the emission factor tables, in the order of their integer codes
+COUNTRY_CODES = ("global",) + tuple(sorted(iso3166.countries_by_alpha2))
+
+# Lookup tables of ISO 3166 countries, keyed by upper case values
+COUNTRY_CODES_2 = frozenset(iso3166.countries_by_alpha2)
+COUNTRY_CODES_3 = frozenset(iso3166.countries_by_alpha3)
+COUNTRY_NAMES = frozenset(iso3166.countries_by_name) | frozenset(
+    iso3166.countries_by_apolitical_name
+)
+# Alpha-2 code of each country by its alpha-2 code, alpha-3 code and names
+COUNTRY_ALIASES = MappingProxyType(
+    {
+        alias.upper(): country.alpha2
+        for country in iso3166.countries
+        for alias in (
+            country.alpha2,
+            country.alpha3,
+            country.name,
+            country.apolitical_name,
+        )
+    }
+)
+
 
 @dataclass
 class BudgetOnePointFiveDegrees:
@@ -44,7 +68,31 @@ class BudgetTwoDegrees:
     budget_per_person_and_year_long: float = 3.4
 
 
-class HeatingFuel(str, enum.Enum):
+class _CodedEnumMeta(enum.EnumMeta):
+    """Metaclass which assigns the integer codes once, when an enum is created"""
+
+    def __new__(metacls, *args, **kwargs):
+        cls = super().__new__(metacls, *args, **kwargs)
+        for code, name in enumerate(cls._member_names_):
+            cls._member_map_[name]._code = code
+        return cls
+
+
+class CodedEnum(enum.Enum, metaclass=_CodedEnumMeta):
+    """Base enum whose members have a stable integer code, given by their order"""
+
+    @property
+    def code(self) -> int:
+        """Integer code of the member"""
+        return self._code
+
+    @classmethod
+    def from_code(cls, code: int):
+        """Returns the member with the given integer code"""
+        return cls[cls._member_names_[code]]
+
+
+class HeatingFuel(str, CodedEnum):
     """Enum for heating fuel types"""
 
     OIL = "oil"
@@ -56,7 +104,7 @@ class HeatingFuel(str, enum.Enum):
 
 
 @enum.unique
-class ElectricityFuel(str, enum.Enum):
+class ElectricityFuel(str, CodedEnum):
     """Enum for electricity fuel types"""
 
     PRODUCTION_FUEL_MIX = "production fuel mix"
@@ -64,7 +112,7 @@ class ElectricityFuel(str, enum.Enum):
 
 
 @enum.unique
-class CarFuel(str, enum.Enum):
+class CarFuel(str, CodedEnum):
     """Enum for car fuel types"""
 
     ELECTRIC = "electric"
@@ -77,7 +125,7 @@ class CarFuel(str, enum.Enum):
 
 
 @enum.unique
-class BusFuel(str, enum.Enum):
+class BusFuel(str, CodedEnum):
     """Enum for bus fuel types"""
 
     ELECTRIC = "electric"
@@ -88,7 +136,7 @@ class BusFuel(str, enum.Enum):
 
 
 @enum.unique
-class Size(str, enum.Enum):
+class Size(str, CodedEnum):
     """Enum for car sizes"""
 
     SMALL = "small"
@@ -98,7 +146,7 @@ class Size(str, enum.Enum):
 
 
 @enum.unique
-class TrainFuel(str, enum.Enum):
+class TrainFuel(str, CodedEnum):
     """Enum for train fuel types"""
 
     ELECTRIC = "electric"
@@ -107,7 +155,7 @@ class TrainFuel(str, enum.Enum):
 
 
 @enum.unique
-class FlightClass(str, enum.Enum):
+class FlightClass(str, CodedEnum):
     """Enum for flight classes"""
 
     ECONOMY = "economy_class"
@@ -117,7 +165,7 @@ class FlightClass(str, enum.Enum):
 
 
 @enum.unique
-class FerryClass(str, enum.Enum):
+class FerryClass(str, CodedEnum):
     """Enum for ferry classes"""
 
     FOOT = "foot_passenger"
@@ -126,7 +174,7 @@ class FerryClass(str, enum.Enum):
 
 
 @enum.unique
-class FlightRange(str, enum.Enum):
+class FlightRange(str, CodedEnum):
     """Enum for flight ranges"""
 
     SHORT_HAUL = "short-haul"
@@ -135,7 +183,7 @@ class FlightRange(str, enum.Enum):
 
 
 @enum.unique
-class BusTrainRange(str, enum.Enum):
+class BusTrainRange(str, CodedEnum):
     """Enum for bus and train ranges"""
 
     LOCAL = "local"
@@ -144,7 +192,7 @@ class BusTrainRange(str, enum.Enum):
 
 
 @enum.unique
-class RangeCategory(str, enum.Enum):
+class RangeCategory(str, CodedEnum):
     """Enum for flight range categories"""
 
     VERY_SHORT_HAUL = "very_short_haul"
@@ -153,20 +201,8 @@ class RangeCategory(str, enum.Enum):
     LONG_HAUL = "long_haul"
 
 
-class DetourCoefficient(float, enum.Enum):
-    BUS = 1.5
-    TRAIN = 1.2
-    PLANE = 1.0
-
-
-class DetourConstant(float, enum.Enum):
-    BUS = 0.0
-    TRAIN = 0.0
-    PLANE = 95
-
-
 @enum.unique
-class TransportationMode(str, enum.Enum):
+class TransportationMode(str, CodedEnum):
     """Enum for transportation modes"""
 
     CAR = "car"
@@ -188,6 +224,7 @@ class Unit(str, enum.Enum):
     KG = "kg"
     L = "l"
     M3 = "m^3"
+    MJ = "mj"
 
 
 @enum.unique
@@ -224,8 +261,8 @@ class CountryCode2(str):
 
     @classmethod
     def validate_country_code(cls, country_code: str) -> str:
-        if country_code in list(iso3166.countries_by_alpha2.keys()):
-            return country_code
+        if str(country_code).upper() in COUNTRY_CODES_2:
+            return str(country_code).upper()
         else:
             raise ValueError(f"{country_code} is not a valid country code")
 
@@ -239,8 +276,8 @@ class CountryCode3(str):
 
     @classmethod
     def validate_country_code(cls, country_code: str) -> str:
-        if country_code in list(iso3166.countries_by_alpha3.keys()):
-            return country_code
+        if str(country_code).upper() in COUNTRY_CODES_3:
+            return str(country_code).upper()
         else:
             raise ValueError(f"{country_code} is not a valid country code")
 
@@ -254,12 +291,26 @@ class CountryName(str):
 
     @classmethod
     def validate_country_name(cls, country_name: str) -> str:
-        if country_name.upper() in list(iso3166.countries_by_name.keys()):
+        if str(country_name).upper() in COUNTRY_NAMES:
             return country_name
         else:
             raise ValueError(f"{country_name} is not a valid country name")
 
 
+def canonical_country_code(country: str) -> str:
+    """Returns the ISO 3166-1 alpha-2 code of a country
+
+    :param country: Alpha-2 code, alpha-3 code or name of the country, in any case
+    :type country: str
+    :return: Alpha-2 code of the country
+    :rtype: str
+    """
+    try:
+        return COUNTRY_ALIASES[str(country).strip().upper()]
+    except KeyError:
+        raise ValueError(f"{country} is not a valid country") from None
+
+
 class IataAirportCode(str):
     """Class for 3-letter IATA airport codes"""
 
@@ -269,7 +320,7 @@ class IataAirportCode(str):
 
     @classmethod
     def validate_iata_code(cls, iata_code: str) -> str:
-        if iata_code in Airports().airports["iata_code"].values:
+        if iata_code in get_airports():
             return iata_code
         else:
             raise ValueError(f"{iata_code} was not found in airport database")
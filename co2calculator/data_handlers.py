@@ -2,12 +2,322 @@
 # -*- coding: utf-8 -*-
 """Data handler class to handle and validate emission factors from csv file"""
 
+import collections
+import enum
+import functools
+import hashlib
+import itertools
+import os
+import pickle
+import platform
+import sys
+import threading
+import warnings
 from pathlib import Path
+from typing import NamedTuple
+import numpy as np
 import pandas as pd
 from .exceptions import EmissionFactorNotFound, ConversionFactorNotFound
 
 script_path = str(Path(__file__).parent)
 
+# Columns of the emission factor tables which are used to select a factor
+LOOKUP_COLUMNS = (
+    "category",
+    "subcategory",
+    "fuel_type",
+    "size",
+    "vehicle_range",
+    "seating",
+    "ferry_class",
+    "country_code",
+)
+
+# Values tried in turn when no emission factor matches a query, in order of preference
+FALLBACKS = (
+    ("country_code", "global"),
+    ("size", "average"),
+    ("fuel_type", "average"),
+    ("vehicle_range", "average"),
+    ("seating", "average"),
+    ("ferry_class", "average"),
+)
+
+# Number of recent queries without emission factor whose diagnosis is kept
+MISS_CACHE_SIZE = 1024
+# Guards the diagnoses of all emission factor tables, which are shared by threads
+_MISS_LOCK = threading.Lock()
+
+
+@enum.unique
+class FactorStatus(enum.IntEnum):
+    """Enum for the outcome of an emission factor lookup"""
+
+    FOUND = 0
+    NOT_FOUND = 1
+    AMBIGUOUS = 2
+
+
+@functools.lru_cache(maxsize=None)
+def _fallback_vocabularies() -> dict[str, frozenset]:
+    """Returns the valid values of the parameters which have a fallback
+
+    Only valid values without a factor of their own fall back, so that unknown values
+    (e.g. typos) are rejected instead of silently getting the general factor.
+    """
+    # Imported here, as constants imports this module
+    from .constants import (
+        COUNTRY_CODES,
+        BusFuel,
+        BusTrainRange,
+        CarFuel,
+        ElectricityFuel,
+        FerryClass,
+        FlightClass,
+        FlightRange,
+        HeatingFuel,
+        Size,
+        TrainFuel,
+    )
+
+    def values(*enums):
+        return frozenset(item.value for enum_class in enums for item in enum_class)
+
+    return {
+        "country_code": frozenset(COUNTRY_CODES),
+        "size": values(Size),
+        "fuel_type": values(CarFuel, BusFuel, TrainFuel, HeatingFuel, ElectricityFuel),
+        "vehicle_range": values(BusTrainRange, FlightRange),
+        "seating": values(FlightClass),
+        "ferry_class": values(FerryClass),
+    }
+
+
+class FactorResolution(NamedTuple):
+    """Emission factor resolved for a query, and the fallbacks used to find it"""
+
+    factor: float
+    parameters: dict
+    fallbacks: tuple
+
+
+def read_table(path) -> pd.DataFrame:
+    """Reads a factor table, storing its text columns as categoricals
+
+    Repeated strings are stored only once per column, and rows are compared by their
+    integer category codes.
+
+    :param path: Path to the CSV file
+    :type path: str
+    :return: Factor table
+    :rtype: pd.DataFrame
+    """
+    table = pd.read_csv(path)
+    text_columns = table.select_dtypes(include="object").columns
+    return table.astype({column: "category" for column in text_columns})
+
+
+class _FactorIndex:
+    """Hash index over an emission factor table
+
+    Maps a combination of column values to the positions of all rows matching it, so
+    that a lookup is a single dictionary access instead of a scan of the table. Values
+    are encoded as integer codes, so the index compares integers instead of strings.
+    """
+
+    def __init__(self, table: pd.DataFrame):
+        """Initialize the index
+
+        :param table: Emission factor table
+        :type table: pd.DataFrame
+        """
+        self.columns = tuple(table.columns)
+        self.co2e = table["co2e"].to_numpy()
+        # Code of each row and codes by value per column. Missing values have code -1,
+        # which no search value is encoded to.
+        self._codes = {}
+        self._categories = {}
+        self._vocabulary = {}
+        for column in self.columns:
+            if isinstance(table[column].dtype, pd.CategoricalDtype):
+                codes = table[column].cat.codes.to_numpy()
+                values = table[column].cat.categories
+            else:
+                codes, values = pd.factorize(table[column])
+            self._codes[column] = codes.tolist()
+            self._categories[column] = list(values)
+            self._vocabulary[column] = {v: code for code, v in enumerate(values)}
+        self._signatures = {}
+        # Index the full combination of lookup columns at load time, other
+        # combinations of search columns are indexed on first use
+        self._index(tuple(c for c in self.columns if c in LOOKUP_COLUMNS))
+
+    def _index(self, signature: tuple) -> dict:
+        """Build the index for one combination of search columns
+
+        :param signature: Names of the search columns, in table order
+        :type signature: tuple
+        :return: Mapping of column value codes to row positions
+        :rtype: dict
+        """
+        index = {}
+        columns = [self._codes[column] for column in signature]
+        for position, key in enumerate(zip(*columns)):
+            index.setdefault(key, []).append(position)
+        index = {key: tuple(positions) for key, positions in index.items()}
+        self._signatures[signature] = index
+        return index
+
+    def normalize(self, parameters: dict) -> tuple:
+        """Convert search parameters into a key of the index
+
+        Parameters given as integers and parameters which are not a column of the table
+        are ignored. All other values are compared as strings.
+
+        :param parameters: Search parameters
+        :type parameters: dict
+        :return: Pairs of column name and search value, in table order
+        :rtype: tuple
+        """
+        items = []
+        for k, v in parameters.items():
+            if isinstance(v, int):
+                continue
+            if hasattr(v, "value"):
+                v = str(v.value)
+            if not isinstance(v, str):
+                v = str(v)
+            if k not in self._vocabulary:
+                continue
+            items.append((k, v))
+        return self.key(items)
+
+    def key(self, items) -> tuple:
+        """Returns pairs of column name and search value in table order
+
+        :param items: Pairs of column name and search value
+        :return: Pairs of column name and search value, in table order
+        :rtype: tuple
+        """
+        return tuple(sorted(items, key=lambda item: self.columns.index(item[0])))
+
+    def contains(self, column: str, value) -> bool:
+        """Returns whether any row of the table has the value in the given column"""
+        return value in self._vocabulary[column]
+
+    def find(self, items: tuple) -> tuple:
+        """Return the positions of all rows matching the given search values
+
+        :param items: Pairs of column name and search value, in table order
+        :type items: tuple
+        :return: Row positions
+        :rtype: tuple
+        """
+        signature = tuple(k for k, _ in items)
+        index = self._signatures.get(signature)
+        if index is None:
+            index = self._index(signature)
+        key = tuple(self._vocabulary[k].get(v, -2) for k, v in items)
+        return index.get(key, ())
+
+    def diagnose(self, items: tuple) -> tuple[str | None, tuple]:
+        """Finds the first search value for which no row matches the previous ones
+
+        The rows matching each single search value are intersected one parameter at a
+        time, so a diagnosis takes one set intersection per parameter.
+
+        :param items: Pairs of column name and search value, in table order
+        :type items: tuple
+        :return: Column of the conflicting search value, and the values of that column
+            which match all other search values (or, if there are none, the previous)
+        :rtype: tuple[str | None, tuple]
+        """
+        candidates = set(range(len(self.co2e)))
+        for column, value in items:
+            matching = candidates.intersection(self.find(((column, value),)))
+            if matching:
+                candidates = matching
+                continue
+            others = tuple(item for item in items if item[0] != column)
+            nearest = set(self.find(others)) if others else candidates
+            codes = self._codes[column]
+            suggestions = {
+                self._categories[column][codes[row]]
+                for row in nearest or candidates
+                if codes[row] >= 0
+            }
+            return column, tuple(sorted(suggestions, key=str))
+        return None, ()
+
+
+class FactorCatalogue:
+    """Catalogue of the parameter combinations which have exactly one emission factor
+
+    Combinations are tuples of the values of the catalogue columns, with None for a
+    column which does not apply to a factor (e.g. the seating of a car).
+    """
+
+    def __init__(self, table: pd.DataFrame):
+        """Initialize the catalogue
+
+        :param table: Emission factor table of one category
+        :type table: pd.DataFrame
+        """
+        self.columns = tuple(
+            column
+            for column in LOOKUP_COLUMNS
+            if column in table.columns and column != "category"
+        )
+        rows = [
+            tuple(None if pd.isna(value) else value for value in row)
+            for row in table[list(self.columns)].itertuples(index=False)
+        ]
+        counts = collections.Counter(rows)
+        self.combinations = frozenset(
+            row for row, count in counts.items() if count == 1
+        )
+        # Combinations by transportation mode, to answer queries for one mode quickly
+        self._by_subcategory = {}
+        if "subcategory" in self.columns:
+            for combination in sorted(self.combinations, key=str):
+                self._by_subcategory.setdefault(combination[0], []).append(combination)
+
+    def _key(self, parameters: dict) -> tuple:
+        """Returns the values of the catalogue columns, as plain values"""
+        return tuple(
+            getattr(value, "value", value)
+            for value in (parameters.get(column) for column in self.columns)
+        )
+
+    def options(self, **parameters) -> dict[str, list]:
+        """Returns the valid values of each column, given the values of the others
+
+        Parameters which are None are not given. For each column, the values are
+        those of the combinations matching the given values of all other columns.
+
+        :return: Sorted valid values, keyed by column
+        :rtype: dict[str, list]
+        """
+        given = dict(zip(self.columns, self._key(parameters)))
+        subcategory = given.get("subcategory")
+        if subcategory is not None:
+            combinations = self._by_subcategory.get(subcategory, [])
+        else:
+            combinations = self.combinations
+        options = {column: set() for column in self.columns}
+        for combination in combinations:
+            mismatches = [
+                column
+                for column, value in zip(self.columns, combination)
+                if given[column] is not None and given[column] != value
+            ]
+            for i, column in enumerate(self.columns):
+                if combination[i] is not None and mismatches in ([], [column]):
+                    options[column].add(combination[i])
+        if subcategory is not None:
+            del options["subcategory"]
+        return {column: sorted(values) for column, values in options.items() if values}
+
 
 class EmissionFactors:
     def __init__(self, data_dir=script_path):
@@ -16,17 +326,29 @@ class EmissionFactors:
         :param data_dir: Path to the directory of the script
         :type data_dir: str
         """
-        self.electricity = pd.read_csv(
+        self.electricity = read_table(
             f"{data_dir}/data/emission_factors_electricity.csv"
         )
-        self.heating = pd.read_csv(f"{data_dir}/data/emission_factors_heating.csv")
-        self.transport = pd.read_csv(f"{data_dir}/data/emission_factors_transport.csv")
+        self.heating = read_table(f"{data_dir}/data/emission_factors_heating.csv")
+        self.transport = read_table(f"{data_dir}/data/emission_factors_transport.csv")
 
         self.databases = {
             "electricity": self.electricity,
             "heating": self.heating,
             "transport": self.transport,
         }
+        self._indexes = {
+            category: _FactorIndex(table) for category, table in self.databases.items()
+        }
+        self.catalogues = {
+            category: FactorCatalogue(table)
+            for category, table in self.databases.items()
+        }
+        self._tensors = {}
+        self._misses = collections.OrderedDict()
+        self._resolutions = {
+            category: self._compile_resolutions(category) for category in self.databases
+        }
 
     def get(self, parameters: dict):
         """Returns emission factor from the database
@@ -46,8 +368,115 @@ class EmissionFactors:
         ], "Please provide a valid emission factor category."
 
         # Search suitable emission factors
-        selected_factors = self._search_factors(parameters, parameters["category"])
+        index = self._indexes[parameters["category"]]
+        items = index.normalize(parameters)
+        selected_factors = index.find(items)
+        if not selected_factors:
+            raise self._not_found(parameters["category"], items)
+
+        return self._select(index, selected_factors)
+
+    def resolve(self, parameters: dict) -> FactorResolution:
+        """Returns emission factor from the database, falling back to more general
+        parameters if there is no factor for the given ones
+
+        The fallbacks (e.g., a country specific factor to the global one, or a specific
+        size to the average size) are tried in the order of FALLBACKS. For the
+        parameter combinations of the database they are resolved when it is loaded.
+        Values which are not valid for their parameter do not fall back.
+
+        :param parameters: Parameters for searching suitable emission factor
+        :type parameters: dict
+        :return: co2e factor, the parameters it was found with and the fallbacks used
+        :rtype: FactorResolution
+        """
+        assert (
+            "category" in parameters
+        ), "Please provide a category for the emission factor."
+        index = self._indexes[parameters["category"]]
+        items = index.normalize(parameters)
+
+        vocabularies = _fallback_vocabularies()
+        if any(
+            k in vocabularies and v not in vocabularies[k] and not index.contains(k, v)
+            for k, v in items
+        ):
+            raise self._not_found(parameters["category"], items)
+
+        # A valid value which no factor has can only be resolved by its fallback
+        fallback_values = dict(FALLBACKS)
+        known_items = tuple(
+            (k, fallback_values[k])
+            if k in fallback_values and not index.contains(k, v)
+            else (k, v)
+            for k, v in items
+        )
+        resolution = self._resolutions[parameters["category"]].get(known_items)
+        if resolution is None:
+            resolution = self._resolve(index, known_items)
+        if resolution is None:
+            # Raise the same error as for a query without fallbacks
+            selected_factors = index.find(items)
+            if not selected_factors:
+                raise self._not_found(parameters["category"], items)
+            return self._select(index, selected_factors)
+
+        substituted = tuple(
+            k for (k, v), item in zip(items, known_items) if v != item[1]
+        )
+        fallbacks = tuple(
+            k for k, _ in FALLBACKS if k in substituted + resolution.fallbacks
+        )
+        return resolution._replace(fallbacks=fallbacks)
+
+    def _not_found(self, category: str, items: tuple) -> EmissionFactorNotFound:
+        """Returns the error for a query without emission factor, with a diagnosis
 
+        Diagnoses are kept for the most recent queries, so repeated invalid queries
+        are rejected without diagnosing them again.
+
+        :param category: Emission category
+        :param items: Pairs of column name and search value, in table order
+        :type category: str
+        :type items: tuple
+        :return: Error naming the conflicting parameter and its valid values
+        :rtype: EmissionFactorNotFound
+        """
+        key = (category, items)
+        with _MISS_LOCK:
+            diagnosis = self._misses.get(key)
+        if diagnosis is None:
+            diagnosis = self._indexes[category].diagnose(items)
+            with _MISS_LOCK:
+                if len(self._misses) >= MISS_CACHE_SIZE:
+                    # Forget the oldest diagnosis
+                    self._misses.popitem(last=False)
+                self._misses[key] = diagnosis
+
+        parameter, suggestions = diagnosis
+        message = (
+            "No suitable emission factor found in database. Please adapt your query."
+        )
+        if parameter is not None and not suggestions:
+            # The factors matching the other parameters have no value in this column
+            message += (
+                f" The parameter {parameter} does not apply to the factors matching "
+                f"the other parameters. Please leave it out."
+            )
+        elif parameter is not None:
+            available = ", ".join(str(suggestion) for suggestion in suggestions[:10])
+            if len(suggestions) > 10:
+                available += f" and {len(suggestions) - 10} more"
+            message += (
+                f" No factor matches {parameter} '{dict(items)[parameter]}' together "
+                f"with the other parameters. Available values of {parameter}: "
+                f"{available}."
+            )
+        return EmissionFactorNotFound(message, parameter, suggestions)
+
+    @staticmethod
+    def _select(index, selected_factors):
+        """Returns the only selected emission factor, raises an error otherwise"""
         if len(selected_factors) == 0:
             raise EmissionFactorNotFound(
                 "No suitable emission factor found in database. Please adapt your query."
@@ -57,41 +486,345 @@ class EmissionFactors:
                 f"{len(selected_factors)} emission factors found. Please provide more specific selection criteria."
             )
         else:
-            return selected_factors["co2e"].values[0]
+            return index.co2e[selected_factors[0]]
 
-    def _search_factors(self, parameters, emission_category):
-        """Searches for emission factors in the database
+    @staticmethod
+    def _resolve(index, items: tuple) -> FactorResolution | None:
+        """Resolves a query by trying the exact parameters and then their fallbacks
 
-        :param parameters: Search parameters
-        :type parameters: dict
-        :param emission_category: Category of emission factors
-        :type emission_category: str
+        :param index: Index of the emission factor table
+        :param items: Pairs of column name and search value, in table order
+        :type index: _FactorIndex
+        :type items: tuple
+        :return: Resolved emission factor, None if there is no unique factor
+        :rtype: FactorResolution | None
         """
-        # Select table for emission category
-        candidates = self.databases[emission_category]
-        for k, v in parameters.items():
-            if isinstance(v, int):
-                continue
-            if hasattr(v, "value"):
-                v = str(v.value)
-            if not isinstance(v, str):
-                v = str(v)
-            if v is None or k not in candidates.columns:
+        selected_factors = index.find(items)
+        if len(selected_factors) > 1:
+            # Fallbacks cannot resolve an ambiguous query
+            return None
+
+        positions = {k: i for i, (k, _) in enumerate(items)}
+        applicable = [
+            (positions[k], fallback)
+            for k, fallback in FALLBACKS
+            if k in positions and items[positions[k]][1] != fallback
+        ]
+        # Try the fewest fallbacks first, and among them the preferred ones
+        for n in range(len(applicable) + 1):
+            for subset in itertools.combinations(applicable, n):
+                attempt = list(items)
+                for i, fallback in subset:
+                    attempt[i] = (attempt[i][0], fallback)
+                selected_factors = index.find(tuple(attempt))
+                if len(selected_factors) == 1:
+                    return FactorResolution(
+                        factor=index.co2e[selected_factors[0]],
+                        parameters=dict(attempt),
+                        fallbacks=tuple(items[i][0] for i, _ in subset),
+                    )
+        return None
+
+    def _compile_resolutions(self, category: str) -> dict:
+        """Resolves all parameter combinations of the values of a table
+
+        :param category: Emission category
+        :type category: str
+        :return: Resolved emission factors, keyed by normalized parameters
+        :rtype: dict
+        """
+        index = self._indexes[category]
+        table = self.databases[category]
+        columns = [
+            column
+            for column in index.columns
+            if column in LOOKUP_COLUMNS and column not in ("category", "subcategory")
+        ]
+        if "subcategory" in table.columns:
+            groups = table.groupby("subcategory", observed=True)
+        else:
+            groups = [(None, table)]
+
+        resolutions = {}
+        for subcategory, group in groups:
+            choices = [[(("category", category),)]]
+            if subcategory is not None:
+                choices.append([(("subcategory", subcategory),)])
+            for column in columns:
+                # Queries may not give a parameter, or give any value of the group
+                values = set(group[column].dropna())
+                if column == "country_code":
+                    values |= set(table[column].dropna())
+                choices.append([()] + [((column, v),) for v in sorted(values)])
+            for combination in itertools.product(*choices):
+                items = index.key(itertools.chain.from_iterable(combination))
+                resolution = self._resolve(index, items)
+                if resolution is not None:
+                    resolutions[items] = resolution
+        return resolutions
+
+    def get_many(
+        self, parameters: pd.DataFrame | dict, category: str = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns emission factors for a table of search parameters
+
+        Each row holds the parameters of one query, named like the keys of the
+        parameters passed to get(). Identical parameter combinations are resolved only
+        once. Missing values (None or NaN) mean that a parameter is not given for a row.
+
+        :param parameters: Search parameters, one row per query
+        :param category: Emission category of all queries, if there is no category column
+        :type parameters: pd.DataFrame | dict
+        :type category: str
+        :return: co2e factors (NaN if no unique factor was found) and FactorStatus per row
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        frame = pd.DataFrame(parameters)
+        if category is not None:
+            frame = frame.assign(category=category)
+        assert (
+            "category" in frame.columns
+        ), "Please provide a category for the emission factors."
+
+        # Encode each row as one integer key for its combination of parameter values
+        n_rows = len(frame)
+        keys = np.zeros(n_rows, dtype=np.int64)
+        columns = []
+        for name in frame.columns:
+            codes, uniques = pd.factorize(frame[name])
+            keys, _ = pd.factorize(keys * (len(uniques) + 1) + codes + 1)
+            columns.append((name, codes, uniques))
+        n_combinations = keys.max() + 1 if n_rows else 0
+
+        # Position of the first row of each parameter combination
+        first_rows = np.empty(n_combinations, dtype=np.int64)
+        first_rows[keys[::-1]] = np.arange(n_rows)[::-1]
+
+        factors = np.full(n_combinations, np.nan)
+        status = np.full(n_combinations, FactorStatus.NOT_FOUND, dtype=np.int8)
+        for combination, row in enumerate(first_rows):
+            query = {
+                name: uniques[codes[row]]
+                for name, codes, uniques in columns
+                if codes[row] != -1
+            }
+            index = self._indexes.get(query.get("category"))
+            if index is None:
                 continue
-            new_candidates = candidates[candidates[k] == v]
-            if new_candidates.empty:
-                return new_candidates
-            candidates = new_candidates
+            selected_factors = index.find(index.normalize(query))
+            if len(selected_factors) == 1:
+                factors[combination] = index.co2e[selected_factors[0]]
+                status[combination] = FactorStatus.FOUND
+            elif len(selected_factors) > 1:
+                status[combination] = FactorStatus.AMBIGUOUS
+
+        return factors[keys], status[keys]
+
+    def tensor(self, category: str):
+        """Returns the emission factors of a category as tensor indexed by enum codes
+
+        The tensor is compiled on first use.
+
+        :param category: Emission category
+        :type category: str
+        :return: Factor tensor
+        :rtype: FactorTensor
+        """
+        if category not in self._tensors:
+            # Imported here, as the tensor axes are defined by the enums in constants
+            from .tensors import AXES, FactorTensor
+
+            self._tensors[category] = FactorTensor(
+                self.databases[category], AXES[category]
+            )
+        return self._tensors[category]
+
+
+class VersionedEmissionFactors:
+    def __init__(self, versions: dict):
+        """Initialize emission factors of several dated versions of the database
+
+        :param versions: Emission factors, or the data directory to load them from,
+            keyed by the date from which they are valid
+        :type versions: dict
+        """
+        dates = sorted(versions, key=lambda date: np.datetime64(date, "D"))
+        self.valid_from = np.array(dates, dtype="datetime64[D]")
+        self.versions = [
+            factors
+            if isinstance(factors, EmissionFactors)
+            else EmissionFactors(factors)
+            for factors in (versions[date] for date in dates)
+        ]
+
+    def as_of(self, date) -> EmissionFactors:
+        """Returns the emission factors valid at the given date
+
+        :param date: Date of the activity
+        :type date: str | datetime.date | np.datetime64
+        :return: Emission factors
+        :rtype: EmissionFactors
+        """
+        version = np.searchsorted(self.valid_from, np.datetime64(date, "D"), "right")
+        if version == 0:
+            raise EmissionFactorNotFound(f"No emission factors valid at {date}.")
+        return self.versions[version - 1]
+
+    def get(self, parameters: dict, date):
+        """Returns emission factor from the database valid at the given date
+
+        :param parameters: Parameters for searching suitable emission factor
+        :param date: Date of the activity
+        :type parameters: dict
+        :type date: str | datetime.date | np.datetime64
+        :return: co2e factor
+        :rtype: float
+        """
+        return self.as_of(date).get(parameters)
+
+    def get_many(
+        self, parameters: pd.DataFrame | dict, dates, category: str = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns emission factors for a table of search parameters and dates
 
-        return candidates
+        Each query is resolved with the version valid at its date, see
+        EmissionFactors.get_many().
+
+        :param parameters: Search parameters, one row per query
+        :param dates: Date of each query
+        :param category: Emission category of all queries, if there is no category column
+        :type parameters: pd.DataFrame | dict
+        :type dates: array-like
+        :type category: str
+        :return: co2e factors (NaN if no unique factor was found) and FactorStatus per row
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        frame = pd.DataFrame(parameters)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        versions = np.searchsorted(self.valid_from, dates, "right") - 1
+
+        factors = np.full(len(frame), np.nan)
+        status = np.full(len(frame), FactorStatus.NOT_FOUND, dtype=np.int8)
+        for version in np.unique(versions[versions >= 0]):
+            rows = versions == version
+            factors[rows], status[rows] = self.versions[version].get_many(
+                frame[rows], category
+            )
+        return factors, status
+
+
+class AirportRecord(NamedTuple):
+    """Airport of the bundled airport table"""
+
+    name: str
+    latitude: float
+    longitude: float
+    country: str
+
+
+class NearestAirports(NamedTuple):
+    """Nearest airports of a list of locations, one row per location"""
+
+    iata_codes: np.ndarray
+    distances: np.ndarray
+
+
+# Types of airports with scheduled passenger flights which count as commercial
+COMMERCIAL_AIRPORT_TYPES = ("large_airport", "medium_airport", "small_airport")
 
 
 class Airports:
-    def __init__(self):
-        """Initialize Airports class"""
+    def __init__(self, data_dir=script_path):
+        """Initialize Airports class
+
+        The bundled table holds the airports of OurAirports
+        (https://ourairports.com/data/) with an IATA code. Where several airports share
+        a code, the one with scheduled service and the largest type is kept.
+
+        :param data_dir: Path to the directory of the script
+        :type data_dir: str
+        """
+        # "NA" is the country code of Namibia, not a missing value
         self.airports = pd.read_csv(
-            "https://davidmegginson.github.io/ourairports-data/airports.csv"
+            f"{data_dir}/data/airports.csv", keep_default_na=False, na_values=[""]
         )
+        self._records = {
+            iata_code: AirportRecord(*record)
+            for iata_code, *record in self.airports[
+                ["iata_code", "name", "latitude_deg", "longitude_deg", "iso_country"]
+            ].itertuples(index=False)
+        }
+        self._spatial_indexes = {}
+
+    def __contains__(self, iata_code) -> bool:
+        return iata_code in self._records
+
+    def get(self, iata_code: str) -> AirportRecord:
+        """Returns the airport with the given IATA code
+
+        :param iata_code: IATA airport code
+        :type iata_code: str
+        :return: Name, coordinates and country of the airport
+        :rtype: AirportRecord
+        """
+        try:
+            return self._records[iata_code]
+        except KeyError:
+            raise ValueError(f"{iata_code} was not found in airport database") from None
+
+    def nearest(
+        self, lat: np.ndarray, long: np.ndarray, k: int = 1, commercial: bool = True
+    ) -> NearestAirports:
+        """Find the k nearest airports of every location
+
+        The spatial index of the airports is built on first use.
+
+        :param lat: Latitudes of the locations
+        :param long: Longitudes of the locations
+        :param k: Number of airports per location
+        :param commercial: Only consider airports with scheduled passenger flights
+        :type lat: np.ndarray
+        :type long: np.ndarray
+        :type k: int
+        :type commercial: bool
+        :return: IATA codes of the airports and their distances in km, sorted by distance
+        :rtype: NearestAirports
+        """
+        from .spatial import SphericalIndex
+
+        if commercial not in self._spatial_indexes:
+            airports = self.airports
+            if commercial:
+                airports = airports[
+                    (airports["scheduled_service"] == "yes")
+                    & airports["type"].isin(COMMERCIAL_AIRPORT_TYPES)
+                ]
+            self._spatial_indexes[commercial] = (
+                airports["iata_code"].to_numpy(),
+                SphericalIndex(airports["latitude_deg"], airports["longitude_deg"]),
+            )
+        iata_codes, index = self._spatial_indexes[commercial]
+        indices, distances = index.query(lat, long, k)
+        return NearestAirports(iata_codes[indices], distances)
+
+
+@functools.lru_cache(maxsize=None)
+def get_airports() -> Airports:
+    """Returns the bundled airports, which are loaded once per process
+
+    :return: Airports
+    :rtype: Airports
+    """
+    return Airports()
+
+
+class NearestStations(NamedTuple):
+    """Nearest train stations of a list of locations, one row per location"""
+
+    names: np.ndarray
+    countries: np.ndarray
+    coordinates: np.ndarray
+    distances: np.ndarray
 
 
 class EUTrainStations:
@@ -101,16 +834,124 @@ class EUTrainStations:
             "https://raw.githubusercontent.com/trainline-eu/stations/master/stations.csv",
             sep=";",
             low_memory=False,
-            usecols=[0, 1, 2, 5, 6, 8],
+            usecols=[0, 1, 2, 5, 6, 8, 11],
         )
+        stations["is_main_station"] = stations["is_main_station"] == "t"
         # remove stations with no coordinates
         self.stations = stations.dropna(subset=["latitude", "longitude"])
+        self._spatial_indexes = {}
+
+    def nearest(
+        self, lat: np.ndarray, long: np.ndarray, k: int = 1, main_stations: bool = True
+    ) -> NearestStations:
+        """Find the k nearest train stations of every location
+
+        The spatial index of the stations is built on first use.
+
+        :param lat: Latitudes of the locations
+        :param long: Longitudes of the locations
+        :param k: Number of stations per location
+        :param main_stations: Only consider main stations
+        :type lat: np.ndarray
+        :type long: np.ndarray
+        :type k: int
+        :type main_stations: bool
+        :return: Names, countries and coordinates (longitude, latitude) of the
+            stations and their distances in km, sorted by distance
+        :rtype: NearestStations
+        """
+        from .spatial import SphericalIndex
+
+        if main_stations not in self._spatial_indexes:
+            stations = self.stations
+            if main_stations:
+                stations = stations[stations["is_main_station"]]
+            self._spatial_indexes[main_stations] = (
+                stations,
+                SphericalIndex(stations["latitude"], stations["longitude"]),
+            )
+        stations, index = self._spatial_indexes[main_stations]
+        indices, distances = index.query(lat, long, k)
+        return NearestStations(
+            stations["name"].to_numpy()[indices],
+            stations["country"].to_numpy()[indices],
+            stations[["longitude", "latitude"]].to_numpy()[indices],
+            distances,
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_train_stations() -> EUTrainStations:
+    """Returns the EU train stations, which are downloaded once per process
+
+    :return: EUTrainStations
+    :rtype: EUTrainStations
+    """
+    return EUTrainStations()
 
 
 class DetourFactors:
     def __init__(self, data_dir=script_path):
-        """Initialize detour factor class"""
-        self.detour_factors = pd.read_csv(f"{data_dir}/data/detour.csv")
+        """Initialize detour factor class
+
+        The detour coefficient and constant of each transportation mode are compiled
+        into arrays indexed by the TransportationMode code. Modes without detour
+        parameters have NaN entries.
+
+        :param data_dir: Path to the directory of the script
+        :type data_dir: str
+        """
+        from .constants import TransportationMode
+
+        self.detour_factors = read_table(f"{data_dir}/data/detour.csv")
+
+        self.coefficients = np.full(len(TransportationMode), np.nan)
+        self.constants = np.full(len(TransportationMode), np.nan)
+        for mode, coefficient, constant in self.detour_factors[
+            ["transportation_mode", "coefficient", "constant [km]"]
+        ].itertuples(index=False):
+            code = TransportationMode(mode).code
+            self.coefficients[code] = coefficient
+            self.constants[code] = constant
+
+    def get_many(self, mode_codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the detour parameters for arrays of transportation mode codes
+
+        Modes without detour parameters (or codes outside TransportationMode, such as
+        -1) get no detour, i.e., a coefficient of 1 and a constant of 0. A single
+        warning lists these modes.
+
+        :param mode_codes: Codes of the transportation modes
+        :type mode_codes: np.ndarray
+        :return: Detour coefficients and detour constants
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        from .constants import TransportationMode
+
+        mode_codes = np.asarray(mode_codes, dtype=np.int64)
+        known = (mode_codes >= 0) & (mode_codes < len(self.coefficients))
+        codes = np.where(known, mode_codes, 0)
+        coefficients = np.where(known, self.coefficients[codes], np.nan)
+        constants = np.where(known, self.constants[codes], np.nan)
+
+        missing = np.isnan(coefficients) | np.isnan(constants)
+        if missing.any():
+            modes = [
+                TransportationMode.from_code(code).value if code >= 0 else "unknown"
+                for code in np.unique(np.where(known, mode_codes, -1)[missing])
+            ]
+            warnings.warn(
+                f"""
+        No detour coefficient or constant available for the transportation modes {modes}.
+        Detour parameters are available for the following transportation modes:
+        {list(self.detour_factors["transportation_mode"])}
+        Using detour_coefficient = 1.0 and detour_constant = 0.0.
+        """,
+                stacklevel=3,
+            )
+            coefficients = np.where(missing, 1.0, coefficients)
+            constants = np.where(missing, 0.0, constants)
+        return coefficients, constants
 
 
 class ConversionFactors:
@@ -120,10 +961,33 @@ class ConversionFactors:
         :param data_dir: Path to the directory of the script
         :type data_dir: str
         """
-        self.conversion_factors = pd.read_csv(
+        self.conversion_factors = read_table(
             f"{data_dir}/data/conversion_factors_heating.csv"
         )
 
+        # Conversion factor and unit by fuel type, which are never modified
+        self._factors = {
+            fuel_type: (conversion_value, unit)
+            for fuel_type, conversion_value, unit in self.conversion_factors[
+                ["fuel_type", "conversion_value", "unit"]
+            ].itertuples(index=False)
+        }
+
+    def get_with_unit(self, fuel_type) -> tuple[float, str]:
+        """Returns conversion factor and unit of the consumption from the database
+
+        :param fuel_type: Fuel type to be converted
+        :type fuel_type: HeatingFuel | str
+        :return: Conversion factor from unit to kwh, unit of the consumption
+        :rtype: tuple[float, str]
+        """
+        try:
+            return self._factors[getattr(fuel_type, "value", fuel_type)]
+        except KeyError:
+            raise ConversionFactorNotFound(
+                "No suitable conversion factor found in database. Please adapt your query."
+            ) from None
+
     def get(self, fuel_type):
         """Returns conversion factors from the database
 
@@ -131,16 +995,380 @@ class ConversionFactors:
         :return: Conversion factor from unit to kwh
         :rtype: float
         """
-        selected_factors = self.conversion_factors.query(
-            f'fuel_type == "{fuel_type.value}"'
+        return self.get_with_unit(fuel_type)[0]
+
+    def get_unit(self, fuel_type):
+        """Returns the unit of the consumption, which is converted to kwh
+
+        :param fuel_type: Fuel type to be converted
+        :return: Unit of the consumption
+        :rtype: str
+        """
+        return self.get_with_unit(fuel_type)[1]
+
+    def to_kwh(self, consumption, fuel_types, units=None) -> np.ndarray:
+        """Converts arrays of consumption values to kwh
+
+        Consumption is given in the unit of the fuel type in the database, unless a
+        unit is given. Consumption in kwh or MJ needs no fuel type. Fuel types and
+        units are compared in lower case.
+
+        Raises:
+        - ConversionFactorNotFound if a fuel type is unknown, or has no conversion
+          factor for its unit
+
+        :param consumption: Consumption values
+        :param fuel_types: Fuel type of each consumption value
+        :param units: Unit of each consumption value, or one unit for all values
+        :type consumption: array-like
+        :type fuel_types: array-like
+        :type units: array-like | Unit | str
+        :return: Consumption in kwh
+        :rtype: np.ndarray
+        """
+        from .constants import HeatingFuel, Unit
+
+        consumption = np.atleast_1d(np.asarray(consumption, dtype=float))
+        fuel_codes, fuels = pd.factorize(
+            np.broadcast_to(np.asarray(fuel_types, dtype=object), consumption.shape)
+        )
+        unit_codes, units = pd.factorize(
+            np.broadcast_to(np.asarray(units, dtype=object), consumption.shape)
         )
-        if selected_factors.empty:
+
+        # Conversion factor for each combination of fuel type and unit, including
+        # missing ones in the last row and column
+        fuels = [str(getattr(fuel, "value", fuel)).lower() for fuel in fuels] + [None]
+        units = [str(getattr(unit, "value", unit)).lower() for unit in units] + [None]
+        heating_fuels = {item.value for item in HeatingFuel}
+        for fuel in fuels[:-1]:
+            if fuel not in heating_fuels:
+                raise ConversionFactorNotFound(f"Unknown fuel type {fuel}.")
+        factors = np.full((len(fuels), len(units)), np.nan)
+        for i, fuel in enumerate(fuels):
+            conversion_value, fuel_unit = self._factors.get(fuel, (np.nan, None))
+            for j, unit in enumerate(units):
+                if unit == Unit.KWH:
+                    factors[i, j] = 1.0
+                elif unit == Unit.MJ:
+                    factors[i, j] = 1 / 3.6
+                elif unit is None or unit == fuel_unit:
+                    factors[i, j] = conversion_value
+
+        row_factors = factors[fuel_codes, unit_codes]
+        invalid = np.isnan(row_factors)
+        if invalid.any():
+            fuel = fuels[fuel_codes[invalid][0]]
+            unit = units[unit_codes[invalid][0]]
             raise ConversionFactorNotFound(
-                "No suitable conversion factor found in database. Please adapt your query."
+                f"No conversion factor found for fuel type {fuel} in unit {unit}."
             )
+        return consumption * row_factors
+
+
+# Data files of the factor tables, relative to the data directory
+FACTOR_FILES = (
+    "data/emission_factors_electricity.csv",
+    "data/emission_factors_heating.csv",
+    "data/emission_factors_transport.csv",
+    "data/conversion_factors_heating.csv",
+    "data/detour.csv",
+)
+# Binary snapshot of the compiled factor tables. Snapshots are only used by the same
+# source code of the table classes; increase the version when the format changes.
+SNAPSHOT_FILE = "data/factors.snapshot"
+SNAPSHOT_VERSION = 8
+# Classes of the tables of a snapshot, keyed by name
+SNAPSHOT_TABLES = {
+    "emission_factors": EmissionFactors,
+    "conversion_factors": ConversionFactors,
+    "detour_factors": DetourFactors,
+}
+
+
+class FactorSnapshot(NamedTuple):
+    """Factor tables of one version of the data files, which are never modified"""
+
+    emission_factors: EmissionFactors
+    conversion_factors: ConversionFactors
+    detour_factors: DetourFactors
+    fingerprint: tuple
+
+
+class FactorRegistry:
+    def __init__(
+        self,
+        data_dir=script_path,
+        emission_factors: EmissionFactors = None,
+        conversion_factors: ConversionFactors = None,
+        detour_factors: DetourFactors = None,
+        hash_content: bool = False,
+    ):
+        """Initialize a registry of factor tables, which are loaded on first use
+
+        The tables are held in an immutable snapshot. A reload builds a new snapshot
+        and replaces the reference to it, so readers never take a lock. Calculations
+        which need several tables should take them from one snapshot.
+
+        :param data_dir: Path to the directory of the script
+        :param emission_factors: Emission factors to use instead of loading them
+        :param conversion_factors: Conversion factors to use instead of loading them
+        :param detour_factors: Detour factors to use instead of loading them
+        :param hash_content: Detect changed data files by content instead of mtime
+        :type data_dir: str
+        :type emission_factors: EmissionFactors
+        :type conversion_factors: ConversionFactors
+        :type detour_factors: DetourFactors
+        :type hash_content: bool
+        """
+        self.data_dir = data_dir
+        self.hash_content = hash_content
+        self._injected = (emission_factors, conversion_factors, detour_factors)
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def snapshot(self) -> FactorSnapshot:
+        """Current factor tables, loaded from the data directory on first access"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load(self.fingerprint())
+                snapshot = self._snapshot
+        return snapshot
+
+    @property
+    def emission_factors(self) -> EmissionFactors:
+        """Emission factors of the current snapshot"""
+        return self.snapshot.emission_factors
+
+    @property
+    def conversion_factors(self) -> ConversionFactors:
+        """Conversion factors of the current snapshot"""
+        return self.snapshot.conversion_factors
+
+    @property
+    def detour_factors(self) -> DetourFactors:
+        """Detour factors of the current snapshot"""
+        return self.snapshot.detour_factors
+
+    def fingerprint(self) -> tuple:
+        """Returns a fingerprint of the data files, which changes with their content
+
+        :return: Modification time and size, or content hash, of each data file
+        :rtype: tuple
+        """
+        return fingerprint(self.data_dir, self.hash_content)
+
+    def reload(self, force: bool = False) -> bool:
+        """Reloads the factor tables if the data files have changed
+
+        The new tables are built before they are swapped in, so calculations keep
+        using the previous snapshot in the meantime.
+
+        :param force: Reload even if the data files have not changed
+        :type force: bool
+        :return: Whether the tables were reloaded
+        :rtype: bool
+        """
+        with self._lock:
+            fingerprint = self.fingerprint()
+            if (
+                not force
+                and self._snapshot is not None
+                and self._snapshot.fingerprint == fingerprint
+            ):
+                return False
+            self._snapshot = self._load(fingerprint)
+        return True
+
+    def reload_in_background(self, force: bool = False) -> threading.Thread:
+        """Reloads the factor tables in a background thread, see reload()
+
+        :param force: Reload even if the data files have not changed
+        :type force: bool
+        :return: Thread which reloads the tables
+        :rtype: threading.Thread
+        """
+        thread = threading.Thread(target=self.reload, args=(force,), daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval: float = 60) -> None:
+        """Checks the data files for changes periodically in a background thread
+
+        :param interval: Seconds between two checks
+        :type interval: float
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop_watching.clear()
+
+        def poll():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.reload()
+                except Exception as error:
+                    # E.g. a data file is being replaced. Keep the current tables
+                    # and try again at the next check.
+                    warnings.warn(
+                        f"Reloading the factor tables failed, keeping the current "
+                        f"ones: {error!r}",
+                        RuntimeWarning,
+                    )
+
+        self._watcher = threading.Thread(target=poll, daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        """Stops checking the data files for changes"""
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _load(self, fingerprint: tuple) -> FactorSnapshot:
+        """Loads the tables which were not given on initialization"""
+        emission_factors, conversion_factors, detour_factors = self._injected
+        if None in self._injected:
+            tables = load_tables(self.data_dir)
+            emission_factors = emission_factors or tables["emission_factors"]
+            conversion_factors = conversion_factors or tables["conversion_factors"]
+            detour_factors = detour_factors or tables["detour_factors"]
+        return FactorSnapshot(
+            emission_factors, conversion_factors, detour_factors, fingerprint
+        )
+
+
+def fingerprint(data_dir=script_path, hash_content: bool = True) -> tuple:
+    """Returns a fingerprint of the data files, which changes with their content
+
+    :param data_dir: Path to the directory of the script
+    :param hash_content: Hash the content of the files instead of using their mtime
+    :type data_dir: str
+    :type hash_content: bool
+    :return: Content hash, or modification time and size, of each data file
+    :rtype: tuple
+    """
+    fingerprint = []
+    for name in FACTOR_FILES:
+        path = Path(data_dir, name)
+        if not path.exists():
+            fingerprint.append(None)
+        elif hash_content:
+            fingerprint.append(hashlib.sha1(path.read_bytes()).hexdigest())
         else:
-            self._last_selected_factors = selected_factors
-            return selected_factors["conversion_value"].values[0]
+            stat = path.stat()
+            fingerprint.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+def compile_snapshot(data_dir=script_path) -> dict:
+    """Compiles the factor tables and their indexes into a binary snapshot
+
+    Run this at build time, so that the tables do not need to be parsed from the CSV
+    files at import. The snapshot is only used as long as the CSV files are unchanged.
+
+    :param data_dir: Path to the directory of the script
+    :type data_dir: str
+    :return: Compiled tables, keyed by name
+    :rtype: dict
+    """
+    tables = {name: table(data_dir) for name, table in SNAPSHOT_TABLES.items()}
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "environment": _snapshot_environment(),
+        "fingerprint": fingerprint(data_dir),
+        "tables": tables,
+    }
+    path = Path(data_dir, SNAPSHOT_FILE)
+    temporary = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(temporary, "wb") as file:
+            pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except OSError:
+        # The snapshot is only an optimization, e.g. the package may be read-only
+        pass
+    finally:
+        temporary.unlink(missing_ok=True)
+    return tables
+
+
+def _snapshot_environment() -> tuple:
+    """Versions of Python and the libraries whose objects a snapshot pickles, and
+    the source code of the pickled classes"""
+    return platform.python_version(), pd.__version__, np.__version__, _source_hash()
+
+
+@functools.lru_cache(maxsize=None)
+def _source_hash() -> str:
+    """Hash of the source files of the modules defining the snapshot tables
+
+    Any change of the classes (e.g. a new attribute) makes older snapshots stale,
+    without relying on the snapshot version being increased.
+    """
+    digest = hashlib.sha256()
+    modules = sorted({table.__module__ for table in SNAPSHOT_TABLES.values()})
+    for module in modules:
+        digest.update(Path(sys.modules[module].__file__).read_bytes())
+    return digest.hexdigest()
+
+
+def load_tables(data_dir=script_path) -> dict:
+    """Loads the factor tables from the snapshot, or from the CSV files if it is stale
+
+    A snapshot is stale if it was compiled from other data files, by another version
+    of the snapshot format, Python, pandas or NumPy, by other source code of the table
+    classes, or if it cannot be read at all.
+
+    :param data_dir: Path to the directory of the script
+    :type data_dir: str
+    :return: Emission, conversion and detour factors, keyed by name
+    :rtype: dict
+    """
+    try:
+        with open(Path(data_dir, SNAPSHOT_FILE), "rb") as file:
+            snapshot = pickle.load(file)
+        if (
+            snapshot["version"] == SNAPSHOT_VERSION
+            and snapshot["environment"] == _snapshot_environment()
+            and snapshot["fingerprint"] == fingerprint(data_dir)
+            and all(
+                isinstance(snapshot["tables"][name], table_class)
+                for name, table_class in SNAPSHOT_TABLES.items()
+            )
+        ):
+            return snapshot["tables"]
+    except Exception:
+        # Any snapshot which cannot be loaded is compiled anew from the CSV files
+        pass
+    return compile_snapshot(data_dir)
+
+
+_registry = FactorRegistry()
+
+
+def get_registry() -> FactorRegistry:
+    """Returns the factor registry shared by all calculations of the process
+
+    :return: Factor registry
+    :rtype: FactorRegistry
+    """
+    return _registry
+
+
+def set_registry(registry: FactorRegistry) -> FactorRegistry:
+    """Replaces the shared factor registry, e.g. to inject test data
 
-    def get_unit(self):
-        return self._last_selected_factors["unit"].values[0]
+    :param registry: Factor registry to use for all calculations
+    :type registry: FactorRegistry
+    :return: The previously used factor registry
+    :rtype: FactorRegistry
+    """
+    global _registry
+    previous, _registry = _registry, registry
+    return previous
@@ -5,9 +5,10 @@
 
 import warnings
 from pathlib import Path
-from typing import Tuple, Union, Optional
+from typing import NamedTuple, Tuple, Union, Optional
 
 import numpy as np
+import pandas as pd
 from openrouteservice.directions import directions
 from openrouteservice.geocode import pelias_search, pelias_structured
 from pydantic import BaseModel, ValidationError, Extra, confloat, root_validator
@@ -22,12 +23,10 @@ from .constants import (
     CountryCode3,
     CountryName,
     IataAirportCode,
-    DetourCoefficient,
-    DetourConstant,
     RangeCategory,
     RoutingProfile,
 )
-from .data_handlers import Airports, EUTrainStations
+from .data_handlers import get_airports, get_registry, get_train_stations
 from .exceptions import (
     AirportCodeNodeFound,
     InvalidSpatialInput,
@@ -38,6 +37,19 @@ from .util import get_ors_client
 
 script_path = str(Path(__file__).parent)
 
+# Mean radius of the earth in km
+EARTH_RADIUS = 6371
+# Number of distances computed at once for distance matrices
+MATRIX_CHUNK_SIZE = 1 << 16
+# Upper edges (in km) of all range categories but the last
+RANGE_CATEGORY_EDGES = np.array([500, 1500, 4000])
+RANGE_CATEGORY_DESCRIPTIONS = (
+    "below 500 km",
+    "500 to 1500 km",
+    "1500 to 4000 km",
+    "above 4000 km",
+)
+
 
 class StructuredLocation(BaseModel, extra=Extra.forbid):
     address: Optional[str]
@@ -63,6 +75,12 @@ class DistanceRequest(BaseModel):
     transportation_mode: TransportationMode
     start: Union[StructuredLocation, TrainStation, Airport]
     destination: Union[StructuredLocation, TrainStation, Airport]
+    via: list[Union[StructuredLocation, TrainStation, Airport]] = []
+
+    @property
+    def locations(self) -> list:
+        """Start, via points and destination in the order of the trip"""
+        return [self.start, *self.via, self.destination]
 
 
 class Coordinate(BaseModel):
@@ -90,6 +108,112 @@ class Coordinate(BaseModel):
         self.long_rad = np.deg2rad(self.long)
 
 
+def _check_coordinates(lat: np.ndarray, long: np.ndarray) -> None:
+    """Check that arrays of coordinates lie within the valid ranges
+
+    Raises:
+    - InvalidCoordinateInput for the first latitude or longitude out of range
+    :param lat: Latitudes in degrees
+    :param long: Longitudes in degrees
+    :type lat: np.ndarray
+    :type long: np.ndarray
+    """
+    # Written as negations so that NaN is rejected as well
+    invalid = ~((lat >= -90) & (lat <= 90))
+    if invalid.any():
+        raise InvalidCoordinateInput(
+            f"Latitude must be between -90 and 90. Got: {lat[invalid].flat[0]}"
+        )
+    invalid = ~((long >= -180) & (long <= 180))
+    if invalid.any():
+        raise InvalidCoordinateInput(
+            f"Longitude must be between -180 and 180. Got: {long[invalid].flat[0]}"
+        )
+
+
+def _coordinate_arrays(lat, long) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert coordinates of a list of locations into flat arrays and validate them
+
+    Raises:
+    - InvalidCoordinateInput if the lengths differ or a coordinate is out of range
+    :param lat: Latitudes in degrees
+    :param long: Longitudes in degrees
+    :type lat: np.ndarray
+    :type long: np.ndarray
+    :return: Latitudes and longitudes
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    lat = np.asarray(lat, dtype=float).ravel()
+    long = np.asarray(long, dtype=float).ravel()
+    if lat.shape != long.shape:
+        raise InvalidCoordinateInput(
+            "Latitudes and longitudes must have the same length. "
+            f"Got: {len(lat)} and {len(long)}"
+        )
+    _check_coordinates(lat, long)
+    return lat, long
+
+
+def haversine_many(
+    lat_start: np.ndarray,
+    long_start: np.ndarray,
+    lat_dest: np.ndarray,
+    long_dest: np.ndarray,
+) -> np.ndarray:
+    """Compute the distances as the crow flies between arrays of locations
+
+    The coordinate arrays are broadcast against each other. Each array is validated
+    once as a whole instead of building a Coordinate per location.
+
+    Raises:
+    - InvalidCoordinateInput if a coordinate is out of range
+    :param lat_start: Latitudes of start
+    :param long_start: Longitudes of start
+    :param lat_dest: Latitudes of destination
+    :param long_dest: Longitudes of destination
+    :type lat_start: np.ndarray
+    :type long_start: np.ndarray
+    :type lat_dest: np.ndarray
+    :type long_dest: np.ndarray
+    :return: Distances in km
+    :rtype: np.ndarray
+    """
+    lat_start = np.asarray(lat_start, dtype=float)
+    long_start = np.asarray(long_start, dtype=float)
+    lat_dest = np.asarray(lat_dest, dtype=float)
+    long_dest = np.asarray(long_dest, dtype=float)
+    _check_coordinates(lat_start, long_start)
+    _check_coordinates(lat_dest, long_dest)
+
+    # convert angles from degree to radians
+    return _great_circle(
+        np.deg2rad(lat_start),
+        np.deg2rad(long_start),
+        np.deg2rad(lat_dest),
+        np.deg2rad(long_dest),
+    )
+
+
+def _great_circle(
+    lat_start: np.ndarray,
+    long_start: np.ndarray,
+    lat_dest: np.ndarray,
+    long_dest: np.ndarray,
+) -> np.ndarray:
+    """Great circle distances in km between validated coordinates in radians"""
+    # compute zeta
+    a = (
+        np.sin((lat_dest - lat_start) / 2) ** 2
+        + np.cos(lat_start)
+        * np.cos(lat_dest)
+        * np.sin((long_dest - long_start) / 2) ** 2
+    )
+    # Clip rounding errors which would make arcsin undefined for antipodes
+    c = 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    return c * EARTH_RADIUS
+
+
 def haversine(
     lat_start: float, long_start: float, lat_dest: float, long_dest: float
 ) -> Kilometer:
@@ -106,25 +230,7 @@ def haversine(
     :return: Distance
     :rtype: Kilometer
     """
-
-    start = Coordinate(lat=lat_start, long=long_start)
-    dest = Coordinate(lat=lat_dest, long=long_dest)
-
-    # convert angles from degree to radians
-    start.deg2rad()
-    dest.deg2rad()
-
-    # compute zeta
-    a = (
-        np.sin((dest.lat_rad - start.lat_rad) / 2) ** 2
-        + np.cos(start.lat_rad)
-        * np.cos(dest.lat_rad)
-        * np.sin((dest.long_rad - start.long_rad) / 2) ** 2
-    )
-    c = 2 * np.arcsin(np.sqrt(a))
-    r = 6371
-
-    return c * r
+    return float(haversine_many(lat_start, long_start, lat_dest, long_dest))
 
 
 def geocoding_airport_pelias(
@@ -174,16 +280,8 @@ def geocoding_airport(iata: IataAirportCode) -> Tuple[str, Tuple[float, float],
     :return: name, coordinates and country of the found airport
     :rtype: Tuple[str, Tuple[float, float], str]
     """
-    df_airports = Airports().airports
-
     airport = Airport(iata_code=iata)
-    name, lat, lon, country = (
-        df_airports[df_airports.iata_code == airport.iata_code][
-            ["name", "latitude_deg", "longitude_deg", "iso_country"]
-        ]
-        .values.flatten()
-        .tolist()
-    )
+    name, lat, lon, country = get_airports().get(airport.iata_code)
     # coords is a string - convert to list of floats
     coords = [lon, lat]
 
@@ -313,7 +411,7 @@ def geocoding_train_stations(loc_dict):
 
     :return: Name, country and coordinates of the found location
     """
-    eu_train_stations = EUTrainStations().stations
+    eu_train_stations = get_train_stations().stations
     station = TrainStation(**loc_dict)
 
     country_code = station.country
@@ -344,6 +442,21 @@ def geocoding_train_stations(loc_dict):
     return res_station_name, res_country, coords
 
 
+def _route(coords: list, profile: RoutingProfile = None) -> dict:
+    """Request a route between given waypoints from ORS, see get_route()"""
+    clnt = get_ors_client()
+
+    # profile may be: driving-car, cycling-regular
+    if profile not in [RoutingProfile.CAR, RoutingProfile.CYCLING] or profile is None:
+        profile = RoutingProfile.CAR
+        warnings.warn(
+            f"Warning! Specified profile not available or no profile passed.\n"
+            f"Profile set to '{profile}' by default.",
+            stacklevel=3,
+        )
+    return directions(clnt, coords, profile=profile)
+
+
 def get_route(coords: list, profile: RoutingProfile = None) -> Kilometer:
     """Obtain the distance of a route between given waypoints using a given profile
     todo: check if coords may also be a tuple/array etc.
@@ -355,17 +468,7 @@ def get_route(coords: list, profile: RoutingProfile = None) -> Kilometer:
     :return: distance of the route
     :rtype: Kilometer
     """
-    clnt = get_ors_client()
-
-    # profile may be: driving-car, cycling-regular
-    if profile not in [RoutingProfile.CAR, RoutingProfile.CYCLING] or profile is None:
-        profile = RoutingProfile.CAR
-        warnings.warn(
-            f"Warning! Specified profile not available or no profile passed.\n"
-            f"Profile set to '{profile}' by default.",
-            stacklevel=2,
-        )
-    route = directions(clnt, coords, profile=profile)
+    route = _route(coords, profile)
     dist = (
         route["routes"][0]["summary"]["distance"] / 1000
     )  # divide by 1000, as we're working with distances in km
@@ -373,6 +476,24 @@ def get_route(coords: list, profile: RoutingProfile = None) -> Kilometer:
     return dist
 
 
+def get_route_legs(coords: list, profile: RoutingProfile = None) -> np.ndarray:
+    """Obtain the distances of the legs of a route between given waypoints
+
+    All waypoints are sent in a single routing request, which returns one segment
+    per leg.
+
+    :param coords: list of [long,lat] coordinates
+    :param profile: driving-car, cycling-regular
+    :type coords: list
+    :type profile: str
+    :return: distance of each leg, from one waypoint to the next
+    :rtype: np.ndarray
+    """
+    route = _route(coords, profile)
+    segments = route["routes"][0]["segments"]
+    return np.array([segment["distance"] for segment in segments]) / 1000
+
+
 def get_route_ferry(
     coords: list, profile: RoutingProfile = None
 ) -> Tuple[Kilometer, Kilometer]:
@@ -437,6 +558,45 @@ def get_route_ferry(
     return dist_ferry, total_dist
 
 
+def _mode_codes(transportation_modes) -> np.ndarray:
+    """Convert transportation modes into their codes, -1 for unknown modes
+
+    :param transportation_modes: Transportation modes (or their values)
+    :type transportation_modes: TransportationMode | np.ndarray
+    :return: Codes of the transportation modes
+    :rtype: np.ndarray
+    """
+    keys, modes = pd.factorize(np.asarray(transportation_modes, dtype=object).ravel())
+    codes = np.full(len(modes) + 1, -1, dtype=np.int64)
+    for i, mode in enumerate(modes):
+        try:
+            codes[i] = TransportationMode(mode).code
+        except ValueError:
+            pass
+    # Missing modes have key -1, which picks the last code
+    return codes[keys].reshape(np.shape(transportation_modes))
+
+
+def apply_detours(distances: np.ndarray, transportation_modes) -> np.ndarray:
+    """Apply the detour of the mode of transport to distances as the crow flies
+
+    The detour parameters of all trips are looked up at once, and a single warning
+    lists the modes without detour parameters, for which no detour is applied.
+
+    :param distances: Distances as the crow flies in km
+    :param transportation_modes: Modes of transport of the trips, broadcast against
+        the distances
+    :type distances: np.ndarray
+    :type transportation_modes: TransportationMode | np.ndarray
+    :return: Distances accounted for detour
+    :rtype: np.ndarray
+    """
+    coefficients, constants = get_registry().detour_factors.get_many(
+        _mode_codes(transportation_modes)
+    )
+    return coefficients * np.asarray(distances) + constants
+
+
 def _apply_detour(
     distance: Kilometer, transportation_mode: TransportationMode
 ) -> Kilometer:
@@ -449,26 +609,172 @@ def _apply_detour(
     :return: Distance accounted for detour
     :rtype: Kilometer
     """
-    try:
-        detour_coefficient = DetourCoefficient[transportation_mode.upper()]
-        detour_constant = DetourConstant[transportation_mode.upper()]
-    except KeyError:
-        detour_coefficient = 1.0
-        detour_constant = 0.0
-        warnings.warn(
-            f"""
-        No detour coefficient or constant available for this transportation mode.
-        Detour parameters are available for the following transportation modes:
-        {list(DetourCoefficient)}
-        Using detour_coefficient = {detour_coefficient} and detour_constant = {detour_constant}.
-        """,
-            stacklevel=2,
-        )
-    distance_with_detour = detour_coefficient * distance + detour_constant
+    coefficients, constants = get_registry().detour_factors.get_many(
+        _mode_codes(transportation_mode)
+    )
+    distance_with_detour = coefficients.item() * distance + constants.item()
 
     return distance_with_detour
 
 
+class NearestDistances(NamedTuple):
+    """Sparse distance matrix holding the k nearest destinations of each origin"""
+
+    indices: np.ndarray
+    distances: np.ndarray
+
+
+def _distance_blocks(
+    lat_start: np.ndarray,
+    long_start: np.ndarray,
+    lat_dest: np.ndarray,
+    long_dest: np.ndarray,
+    chunk_size: int,
+):
+    """Yield the rows of a great circle distance matrix in memory-bounded blocks
+
+    Coordinates are validated and converted to radians once. Each block holds at most
+    chunk_size float64 distances (but at least one row).
+
+    :return: Generator of row slices and the distances of those rows
+    """
+    points = []
+    for lat, long in ((lat_start, long_start), (lat_dest, long_dest)):
+        lat, long = _coordinate_arrays(lat, long)
+        points.append((np.deg2rad(lat), np.deg2rad(long)))
+    (lat_start, long_start), (lat_dest, long_dest) = points
+
+    rows = max(1, chunk_size // max(1, len(lat_dest)))
+    for start in range(0, len(lat_start), rows):
+        block = slice(start, start + rows)
+        yield block, _great_circle(
+            lat_start[block, None], long_start[block, None], lat_dest, long_dest
+        )
+
+
+def distance_matrix(
+    lat_start: np.ndarray,
+    long_start: np.ndarray,
+    lat_dest: np.ndarray,
+    long_dest: np.ndarray,
+    transportation_mode: Optional[TransportationMode] = None,
+    dtype: type = np.float64,
+    chunk_size: int = MATRIX_CHUNK_SIZE,
+) -> np.ndarray:
+    """Compute the distances from every start to every destination
+
+    The matrix is computed in blocks of rows, so apart from the result only one block
+    of float64 distances is held in memory. Pass dtype=np.float32 to halve the size
+    of the result.
+
+    Raises:
+    - InvalidCoordinateInput if a coordinate is out of range
+    :param lat_start: Latitudes of the starts
+    :param long_start: Longitudes of the starts
+    :param lat_dest: Latitudes of the destinations
+    :param long_dest: Longitudes of the destinations
+    :param transportation_mode: Mode of transport whose detour is applied, distances
+        as the crow flies if None
+    :param dtype: Floating point type of the result
+    :param chunk_size: Maximum number of distances computed at once
+    :type lat_start: np.ndarray
+    :type long_start: np.ndarray
+    :type lat_dest: np.ndarray
+    :type long_dest: np.ndarray
+    :type transportation_mode: TransportationMode
+    :type dtype: type
+    :type chunk_size: int
+    :return: Distances in km, one row per start and one column per destination
+    :rtype: np.ndarray
+    """
+    detour = (1.0, 0.0)
+    if transportation_mode is not None:
+        detour = get_registry().detour_factors.get_many(
+            _mode_codes(transportation_mode)
+        )
+
+    result = np.empty((np.size(lat_start), np.size(lat_dest)), dtype=dtype)
+    for rows, distances in _distance_blocks(
+        lat_start, long_start, lat_dest, long_dest, chunk_size
+    ):
+        result[rows] = detour[0] * distances + detour[1]
+    return result
+
+
+def nearest_distances(
+    lat_start: np.ndarray,
+    long_start: np.ndarray,
+    lat_dest: np.ndarray,
+    long_dest: np.ndarray,
+    k: int,
+    transportation_mode: Optional[TransportationMode] = None,
+    chunk_size: int = MATRIX_CHUNK_SIZE,
+) -> NearestDistances:
+    """Find the k nearest destinations of every start
+
+    Only the k nearest destinations of each start are kept, so the full distance
+    matrix is never held in memory.
+
+    Raises:
+    - InvalidCoordinateInput if a coordinate is out of range
+    :param lat_start: Latitudes of the starts
+    :param long_start: Longitudes of the starts
+    :param lat_dest: Latitudes of the destinations
+    :param long_dest: Longitudes of the destinations
+    :param k: Number of destinations per start (at most the number of destinations)
+    :param transportation_mode: Mode of transport whose detour is applied, distances
+        as the crow flies if None
+    :param chunk_size: Maximum number of distances computed at once
+    :type lat_start: np.ndarray
+    :type long_start: np.ndarray
+    :type lat_dest: np.ndarray
+    :type long_dest: np.ndarray
+    :type k: int
+    :type transportation_mode: TransportationMode
+    :type chunk_size: int
+    :return: Indices of the destinations and their distances in km, sorted by distance
+    :rtype: NearestDistances
+    """
+    if k < 1:
+        raise ValueError(f"k must be at least 1. Got: {k}")
+    detour = (1.0, 0.0)
+    if transportation_mode is not None:
+        detour = get_registry().detour_factors.get_many(
+            _mode_codes(transportation_mode)
+        )
+
+    k = min(k, np.size(lat_dest))
+    indices = np.empty((np.size(lat_start), k), dtype=np.int64)
+    nearest = np.empty((np.size(lat_start), k))
+    for rows, distances in _distance_blocks(
+        lat_start, long_start, lat_dest, long_dest, chunk_size
+    ):
+        # The detour is monotonic, so it can be applied to the selection only
+        selected = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        selected_distances = np.take_along_axis(distances, selected, axis=1)
+        order = np.argsort(selected_distances, axis=1, kind="stable")
+        indices[rows] = np.take_along_axis(selected, order, axis=1)
+        nearest[rows] = np.take_along_axis(selected_distances, order, axis=1)
+    return NearestDistances(indices, detour[0] * nearest + detour[1])
+
+
+def range_category_codes(distances: np.ndarray) -> np.ndarray:
+    """Categorize trips according to the travelled distances
+
+    Raises:
+    - ValueError if a distance is negative (or NaN)
+    :param distances: Distances travelled in km
+    :type distances: np.ndarray
+    :return: Codes of the range categories, in the order of RangeCategory
+    :rtype: np.ndarray
+    """
+    distances = np.asarray(distances, dtype=float)
+    if not (distances >= 0).all():
+        raise ValueError("Distance must not be negative!")
+    # A distance on an edge belongs to the lower category
+    return np.searchsorted(RANGE_CATEGORY_EDGES, distances).astype(np.int8)
+
+
 def range_categories(distance: Kilometer) -> Tuple[RangeCategory, str]:
     """Function to categorize a trip according to the travelled distance
 
@@ -478,28 +784,15 @@ def range_categories(distance: Kilometer) -> Tuple[RangeCategory, str]:
              Range description (i.e., what range of distances does to category correspond to)
     :rtype: tuple[RangeCategory, str]
     """
-    if distance < 0:
-        raise ValueError("Distance must not be negative!")
-    elif distance <= 500:
-        range_cat = RangeCategory.VERY_SHORT_HAUL
-        range_description = "below 500 km"
-    elif distance <= 1500:
-        range_cat = RangeCategory.SHORT_HAUL
-        range_description = "500 to 1500 km"
-    elif distance <= 4000:
-        range_cat = RangeCategory.MEDIUM_HAUL
-        range_description = "1500 to 4000 km"
-    else:
-        range_cat = RangeCategory.LONG_HAUL
-        range_description = "above 4000 km"
-
-    return range_cat, range_description
+    code = range_category_codes(distance).item()
+    return RangeCategory.from_code(code), RANGE_CATEGORY_DESCRIPTIONS[code]
 
 
 def create_distance_request(
     start: str | dict,
     destination: str | dict,
     transportation_mode: TransportationMode,
+    via: list[str | dict] = None,
 ) -> DistanceRequest:
     """Transform and validate the user input into a proper model for distance calculations
 
@@ -509,9 +802,11 @@ def create_distance_request(
     :param start: Start of the trip
     :param destination: Destination of the trip
     :param transportation_mode: Mode of transport used in the trip
+    :param via: Locations visited between start and destination, in order
     :type start: Union[str, dict]
     :type destination: Union[str, dict]
     :type transportation_mode: TransportationMode
+    :type via: list[Union[str, dict]]
     :return: Request for distance calculation between two locations for a given transportation mode
     :rtype: DistanceRequest
     """
@@ -519,66 +814,61 @@ def create_distance_request(
     # Validate the spatial data wrt. the mode of transportation
     # And creates a DistanceRequest object containing either StructuredLocation,
     # TrainStation or Airport objects based on the user input address_type
-    # for start and destination, if nothing is given assume StructuredLocation
+    # for start, via points and destination, if nothing is given assume StructuredLocation
 
     try:
-        locations = [None, None]
-        for i, o in enumerate([start, destination]):
-            if isinstance(o, dict):
-                if "address_type" in o:
-                    if o["address_type"] == AddressType.ADDRESS:
-                        del o["address_type"]
-                        locations[i] = StructuredLocation(**o)
-                    elif o["address_type"] == AddressType.TRAINSTATION:
-                        del o["address_type"]
-                        locations[i] = TrainStation(**o)
-                    elif o["address_type"] == AddressType.AIRPORT:
-                        del o["address_type"]
-                        locations[i] = Airport(iata_code=o["IATA"])
-                    else:
-                        raise InvalidSpatialInput(
-                            f"unknown address type: '{o['address_type']}'"
-                        )
-                else:
-                    # print(
-                    #    "No address type provided: ('address', 'trainstation' ,'airport'), assume address"
-                    # )
-                    locations[i] = StructuredLocation(**o)
-            elif isinstance(o, str):
-                locations[i] = StructuredLocation(locality=o)
-            else:
-                raise InvalidSpatialInput(
-                    f"start and destination must be either dict or string, not {type(o)}"
-                )
-
+        start, *via, destination = [
+            _create_location(o) for o in [start, *(via or []), destination]
+        ]
         return DistanceRequest(
             transportation_mode=transportation_mode,
-            start=locations[0],
-            destination=locations[1],
+            start=start,
+            destination=destination,
+            via=via,
         )
 
     except ValidationError as e:
         raise InvalidSpatialInput(e)
 
 
-def get_distance(
-    request: DistanceRequest,
-) -> tuple[Kilometer, list[tuple[float, float]]]:
-    """Get the distance between start and destination
+def _create_location(o: str | dict) -> Union[StructuredLocation, TrainStation, Airport]:
+    """Transform the user input of one location into a location model, see
+    create_distance_request()"""
+    if isinstance(o, dict):
+        if "address_type" in o:
+            if o["address_type"] == AddressType.ADDRESS:
+                del o["address_type"]
+                return StructuredLocation(**o)
+            elif o["address_type"] == AddressType.TRAINSTATION:
+                del o["address_type"]
+                return TrainStation(**o)
+            elif o["address_type"] == AddressType.AIRPORT:
+                del o["address_type"]
+                return Airport(iata_code=o["IATA"])
+            else:
+                raise InvalidSpatialInput(
+                    f"unknown address type: '{o['address_type']}'"
+                )
+        else:
+            # print(
+            #    "No address type provided: ('address', 'trainstation' ,'airport'), assume address"
+            # )
+            return StructuredLocation(**o)
+    elif isinstance(o, str):
+        return StructuredLocation(locality=o)
+    else:
+        raise InvalidSpatialInput(
+            f"start, destination and via must be either dict or string, not {type(o)}"
+        )
 
-    Raises:
-    - InvalidSpatialInput if start and stop are malformed or None
-    :param request: Request for distance calculation between two locations for a given transportation mode
-    :type request: DistanceRequest
-    :return: Distance
-    :rtype: Kilometer
-    """
 
+def _geocode_locations(locations: list) -> list[tuple[float, float]]:
+    """Geocode the locations of a distance request, see get_distance()"""
     # Calculate cords
     coords = []
     # StructuredLocation, TrainStation, Airport based on the object class of
-    # start and destination in the request
-    for loc in [request.start, request.destination]:
+    # each location in the request
+    for loc in locations:
         if isinstance(loc, StructuredLocation):
             _, _, loc_coords, _ = geocoding_structured(loc.dict())
         elif isinstance(loc, TrainStation):
@@ -588,6 +878,26 @@ def get_distance(
         else:
             raise Exception("Address Type not valid")
         coords.append(loc_coords)
+    return coords
+
+
+def get_leg_distances(
+    request: DistanceRequest,
+) -> tuple[np.ndarray, list[tuple[float, float]]]:
+    """Get the distance of each leg between start, via points and destination
+
+    Road distances of all legs are obtained in a single routing request. For other
+    modes of transport, the distances as the crow flies of all legs are computed at
+    once and the detour is applied to each leg.
+
+    Raises:
+    - InvalidSpatialInput if the distances of legs are not available for the mode
+    :param request: Request for distance calculation between locations for a given transportation mode
+    :type request: DistanceRequest
+    :return: Distance of each leg and coordinates of the locations
+    :rtype: tuple[np.ndarray, list[tuple[float, float]]]
+    """
+    coords = _geocode_locations(request.locations)
 
     # TODO: Do we want to calculate the distance for bicycles and pedelecs same like for cars?
     if request.transportation_mode in [
@@ -596,7 +906,7 @@ def get_distance(
         TransportationMode.PEDELEC,
         TransportationMode.BICYCLE,
     ]:
-        return get_route(coords, RoutingProfile.CAR), coords
+        return get_route_legs(coords, RoutingProfile.CAR), coords
 
     elif request.transportation_mode in [
         TransportationMode.TRAIN,
@@ -604,17 +914,32 @@ def get_distance(
         TransportationMode.BUS,
         TransportationMode.PLANE,
     ]:
+        # compute great circle distances between consecutive locations at once
+        points = np.asarray(coords, dtype=float)
+        distances = haversine_many(
+            points[:-1, 1], points[:-1, 0], points[1:, 1], points[1:, 0]
+        )
+        return apply_detours(distances, request.transportation_mode), coords
 
-        distance = 0
-        # This could also be used for longer lists of cords (with via)
-        for i in range(len(coords) - 1):
-            # compute great circle distance between locations
-            distance += haversine(
-                coords[i][1], coords[i][0], coords[i + 1][1], coords[i + 1][0]
-            )
-        return _apply_detour(distance, request.transportation_mode), coords
+    raise InvalidSpatialInput(
+        f"Distances of legs are not available for {request.transportation_mode}"
+    )
+
+
+def get_distance(
+    request: DistanceRequest,
+) -> tuple[Kilometer, list[tuple[float, float]]]:
+    """Get the distance between start and destination, passing the via points
 
+    Raises:
+    - InvalidSpatialInput if start and stop are malformed or None
+    :param request: Request for distance calculation between locations for a given transportation mode
+    :type request: DistanceRequest
+    :return: Distance
+    :rtype: Kilometer
+    """
     if request.transportation_mode == TransportationMode.FERRY:
+        coords = _geocode_locations(request.locations)
         # hardcoding not ideal, profile should be determined based on specified "seating type"
         distance, distance_total = get_route_ferry(coords, profile=RoutingProfile.WALK)
 
@@ -622,3 +947,6 @@ def get_distance(
         # TODO: implement this
         remaining_distance = distance - distance_total
         return distance
+
+    distances, coords = get_leg_distances(request)
+    return float(distances.sum()), coords
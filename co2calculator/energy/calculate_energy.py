@@ -2,20 +2,20 @@
 
 from typing import Union, Tuple
 from co2calculator.constants import Unit
-from co2calculator.data_handlers import ConversionFactors, EmissionFactors
+from co2calculator.data_handlers import get_registry
 from co2calculator.parameters import (
     ElectricityEmissionParameters,
     HeatingEmissionParameters,
+    ElectricityEmissionRecord,
+    HeatingEmissionRecord,
+    parse_with_factor,
 )
 from co2calculator._types import Kilogram
 
-emission_factors = EmissionFactors()
-conversion_factors = ConversionFactors()
-
 
 def calc_co2_heating(
     consumption: float, options: Union[HeatingEmissionParameters, dict]
-) -> Tuple[Kilogram, float, HeatingEmissionParameters]:
+) -> Tuple[Kilogram, float, HeatingEmissionRecord]:
     """Function to compute heating emissions
 
     :param consumption: energy consumption
@@ -27,30 +27,57 @@ def calc_co2_heating(
     :return params: parameters for heating emissions calculation
     :rtype: Tuple
     """
+    co2e, co2e_factor, params, _ = calc_co2_heating_with_unit(consumption, options)
+    return co2e, co2e_factor, params
+
+
+def calc_co2_heating_with_unit(
+    consumption: float, options: Union[HeatingEmissionParameters, dict]
+) -> Tuple[Kilogram, float, HeatingEmissionRecord, str]:
+    """Function to compute heating emissions and the unit of the consumption
+
+    The unit is taken from the same tables as the factors.
+
+    :param consumption: energy consumption
+    :param options: parameters for heating emissions calculation
+    :type consumption: float
+    :type options: HeatingParameters | dict
+    :return co2e: total emissions of heating energy consumption (kg)
+    :return co2e_factor: heating emission factor
+    :return params: parameters for heating emissions calculation
+    :return unit: unit of the consumption
+    :rtype: Tuple
+    """
     # Validate parameters
     if options is None:
         options = {}
 
-    params = HeatingEmissionParameters.parse_obj(options)
+    # Take both tables from one snapshot, in case they are reloaded meanwhile
+    factors = get_registry().snapshot
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(
+        HeatingEmissionParameters, options, factors.emission_factors
+    )
 
     if params.in_kwh is not True:
-        # Get the conversion factor
-        conversion_factor = conversion_factors.get(fuel_type=params.fuel_type)
+        # Get the conversion factor and the unit of the consumption
+        conversion_factor, unit = factors.conversion_factors.get_with_unit(
+            params.fuel_type
+        )
 
         consumption_kwh = consumption * conversion_factor
     else:
         consumption_kwh = consumption
+        unit = "kWh"
 
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
     co2e = consumption_kwh * co2e_factor * params.own_share
 
-    return co2e, co2e_factor, params
+    return co2e, co2e_factor, params, unit
 
 
 def calc_co2_electricity(
     consumption: float, options: Union[ElectricityEmissionParameters, dict]
-) -> Tuple[Kilogram, float, ElectricityEmissionParameters]:
+) -> Tuple[Kilogram, float, ElectricityEmissionRecord]:
     """Function to compute electricity emissions
 
     :param consumption: energy consumption
@@ -67,9 +94,8 @@ def calc_co2_electricity(
     if options is None:
         options = {}
 
-    params = ElectricityEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(ElectricityEmissionParameters, options)
 
     co2e = consumption * co2e_factor * params.own_share
     return co2e, co2e_factor, params
@@ -4,9 +4,17 @@
 
 
 class EmissionFactorNotFound(Exception):
-    def __init__(self, message):
-        """Init"""
+    def __init__(self, message, parameter=None, suggestions=()):
+        """Init
+
+        :param message: Error message
+        :param parameter: First search parameter for which no factor was found
+        :param suggestions: Values of that parameter which have a factor
+        """
+        super().__init__(message)
         self.message = message
+        self.parameter = parameter
+        self.suggestions = suggestions
 
 
 class ConversionFactorNotFound(Exception):
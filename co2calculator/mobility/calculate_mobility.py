@@ -1,6 +1,8 @@
 """Function collection to calculate mobility type co2 emissions"""
 
 from typing import Union, Tuple
+
+import numpy as np
 from pydantic import ValidationError
 
 from co2calculator.constants import EmissionCategory, FlightRange, TransportationMode
@@ -15,16 +17,23 @@ from ..parameters import (
     TramEmissionParameters,
     PedelecEmissionParameters,
     BicycleEmissionParameters,
+    BusEmissionRecord,
+    CarEmissionRecord,
+    FerryEmissionRecord,
+    MotorbikeEmissionRecord,
+    PlaneEmissionRecord,
+    TrainEmissionRecord,
+    parse_with_factor,
 )
-from ..data_handlers import ConversionFactors, EmissionFactors
 
-emission_factors = EmissionFactors()
-conversion_factors = ConversionFactors()
+
+# Longest distance (in km) of short-haul flights
+FLIGHT_RANGE_LIMIT = 3700
 
 
 def calc_co2_car(
     distance: Kilometer, options: Union[CarEmissionParameters, dict] = None
-) -> Tuple[Kilogram, float, CarEmissionParameters]:
+) -> Tuple[Kilogram, float, CarEmissionRecord]:
     """Function to compute the emissions of a car trip.
 
     :param distance: Distance travelled by car (km), alternatively param <locations> can be provided
@@ -32,14 +41,12 @@ def calc_co2_car(
     :type distance: Kilometer
     :type options: Union[CarEmissionParameters, dict]
     :return: Total emissions of trip in co2 equivalents, Co2e factor and the parameters
-    :rtype: Tuple[Kilogram, float, CarEmissionParameters]
+    :rtype: Tuple[Kilogram, float, CarEmissionRecord]
     """
     if options is None:
         options = {}
-    # Validate parameters
-    params = CarEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(CarEmissionParameters, options)
     # Calculate emissions
     co2e = distance * co2e_factor / params.passengers
     return co2e, co2e_factor, params
@@ -47,7 +54,7 @@ def calc_co2_car(
 
 def calc_co2_motorbike(
     distance: Kilometer, options: Union[MotorbikeEmissionParameters, dict] = None
-) -> Tuple[Kilogram, float, MotorbikeEmissionParameters]:
+) -> Tuple[Kilogram, float, MotorbikeEmissionRecord]:
     """Function to compute the emissions of a motorbike trip.
 
     :param distance: Distance travelled by motorbike (km), alternatively param <locations> can be provided
@@ -55,14 +62,13 @@ def calc_co2_motorbike(
     :type distance: Kilometer
     :type options: Union[MotorbikeEmissionParameters, dict]
     :return: Total emissions of trip in co2 equivalents, Co2e factor and the parameters
-    :rtype: Tuple[Kilogram, float, MotorbikeEmissionParameters]
+    :rtype: Tuple[Kilogram, float, MotorbikeEmissionRecord]
     """
     # Validate parameters
     if options is None:
         options = {}
-    params = MotorbikeEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(MotorbikeEmissionParameters, options)
     # Calculate emissions
     co2e = distance * co2e_factor
     return co2e, co2e_factor, params
@@ -70,7 +76,7 @@ def calc_co2_motorbike(
 
 def calc_co2_bus(
     distance: Kilometer, options: Union[BusEmissionParameters, dict] = None
-) -> Tuple[Kilogram, float, BusEmissionParameters]:
+) -> Tuple[Kilogram, float, BusEmissionRecord]:
     """Function to compute the emissions of a bus trip.
 
     :param distance: Distance travelled by bus (km), alternatively param <locations> can be provided
@@ -78,14 +84,13 @@ def calc_co2_bus(
     :type distance: Kilometer
     :type options: Union[BusEmissionParameters, dict]
     :return: Total emissions of trip in co2 equivalents, Co2e factor and the parameters
-    :rtype: Tuple[Kilogram, float, BusEmissionParameters]
+    :rtype: Tuple[Kilogram, float, BusEmissionRecord]
     """
     # Validate parameters
     if options is None:
         options = {}
-    params = BusEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(BusEmissionParameters, options)
     # Calculate emissions
     co2e = distance * co2e_factor
     return co2e, co2e_factor, params
@@ -93,30 +98,47 @@ def calc_co2_bus(
 
 def calc_co2_train(
     distance: Kilometer, options: Union[TrainEmissionParameters, dict] = None
-) -> Tuple[Kilogram, float, TrainEmissionParameters]:
+) -> Tuple[Kilogram, float, TrainEmissionRecord]:
     """Function to compute the emissions of a train trip.
+    If there is no emission factor for the given country, the global one is used.
 
     :param distance: Distance travelled by train (km), alternatively param <locations> can be provided
     :param options: Options for the train trip
     :type distance: Kilometer
     :type options: Union[TrainEmissionParameters, dict]
     :return: Total emissions of trip in co2 equivalents, Co2e factor and the parameters
-    :rtype: Tuple[Kilogram, float, TrainEmissionParameters]
+    :rtype: Tuple[Kilogram, float, TrainEmissionRecord]
     """
 
     if options is None:
         options = {}
-    params = TrainEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(
+        TrainEmissionParameters, options, resolve=True
+    )
     # Calculate emissions
     co2e = distance * co2e_factor
     return co2e, co2e_factor, params
 
 
+def flight_range_codes(distances: np.ndarray) -> np.ndarray:
+    """Classify flights as short or long haul according to their distances
+
+    :param distances: Flight distances in km
+    :type distances: np.ndarray
+    :return: Codes of the flight ranges, in the order of FlightRange
+    :rtype: np.ndarray
+    """
+    return np.where(
+        np.asarray(distances) <= FLIGHT_RANGE_LIMIT,
+        FlightRange.SHORT_HAUL.code,
+        FlightRange.LONG_HAUL.code,
+    ).astype(np.int8)
+
+
 def calc_co2_plane(
     distance: Kilometer, options: PlaneEmissionParameters = None
-) -> Tuple[Kilogram, float, PlaneEmissionParameters]:
+) -> Tuple[Kilogram, float, PlaneEmissionRecord]:
     """Function to compute emissions of a plane trip
 
     :param distance: Distance of flight (km), alternatively param <locations> can be provided
@@ -124,23 +146,21 @@ def calc_co2_plane(
     :type distance: Kilometer
     :type options: PlaneEmissionParameters
     :return: Total emissions of flight in co2 equivalents, Co2e factor and the parameters
-    :rtype: Tuple[Kilogram, float, PlaneEmissionParameters]
+    :rtype: Tuple[Kilogram, float, PlaneEmissionRecord]
     """
 
     if options is None:
         options = {}
     # Retrieve whether distance is <= 3700 or above 3700 km
-    # TODO: Put this in extra function?
     if distance is None:
         raise ValueError("Distance is not given. Range can not be calculated.")
-    if distance <= 3700:
+    if distance <= FLIGHT_RANGE_LIMIT:
         options["vehicle_range"] = FlightRange.SHORT_HAUL
     else:
         options["vehicle_range"] = FlightRange.LONG_HAUL
 
-    params = PlaneEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(PlaneEmissionParameters, options)
     # Calculate emissions
     co2e = distance * co2e_factor
     return co2e, co2e_factor, params
@@ -148,7 +168,7 @@ def calc_co2_plane(
 
 # def calc_co2_ferry(
 #    distance: Kilometer, options: Union[FerryEmissionParameters, dict] = None
-# ) -> Tuple[Kilogram, float, FerryEmissionParameters]:
+# ) -> Tuple[Kilogram, float, FerryEmissionRecord]:
 #    """Function to compute emissions of a ferry trip
 #
 #    :param distance: Distance of ferry trip (km), alternatively param <locations> can be provided
@@ -156,13 +176,12 @@ def calc_co2_plane(
 #    :type distance: Kilometer
 #    :type options: Union[FerryEmissionParameters, dict]
 #    :return: Total emissions of ferry trip in co2 equivalents, Co2e factor and the parameters
-#    :rtype: Tuple[Kilogram, float, FerryEmissionParameters]
+#    :rtype: Tuple[Kilogram, float, FerryEmissionRecord]
 #    """
 #    if options is None:
 #        options = {}
-#    params = FerryEmissionParameters.parse_obj(options)
-#    # Get the co2 factor
-#    co2e_factor = emission_factors.get(params.dict())
+#    # Validate parameters and get the co2 factor
+#    params, co2e_factor = parse_with_factor(FerryEmissionParameters, options)
 #    # Calculate emissions
 #    co2e = distance * co2e_factor
 #   return co2e, co2e_factor, params
@@ -182,9 +201,8 @@ def calc_co2_bicycle(
     """
     if options is None:
         options = {}
-    params = BicycleEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(BicycleEmissionParameters, options)
     # Calculate emissions
     co2e = distance * co2e_factor
     return co2e, co2e_factor, None
@@ -204,9 +222,8 @@ def calc_co2_pedelec(
     """
     if options is None:
         options = {}
-    params = PedelecEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(PedelecEmissionParameters, options)
     # Calculate emissions
     co2e = distance * co2e_factor
     return co2e, co2e_factor, None
@@ -227,9 +244,8 @@ def calc_co2_tram(
 
     if options is None:
         options = {}
-    params = TramEmissionParameters.parse_obj(options)
-    # Get the co2 factor
-    co2e_factor = emission_factors.get(params.dict())
+    # Validate parameters and get the co2 factor
+    params, co2e_factor = parse_with_factor(TramEmissionParameters, options)
     # Calculate emissions
     co2e = distance * co2e_factor
     return co2e, co2e_factor, None
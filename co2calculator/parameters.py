@@ -2,8 +2,13 @@
 # -*- coding: utf-8 -*-
 """Base classes to handle and validate parameters for emission calculations"""
 
-from typing import Union
+import collections
+import functools
+import weakref
+from typing import Callable, NamedTuple, Union
 
+import numpy as np
+import pandas as pd
 from pydantic import BaseModel, validator, root_validator, ValidationError
 
 # from .api.trip import Trip ##--> causes circular import
@@ -20,8 +25,85 @@ from .constants import (
     HeatingFuel,
     EmissionCategory,
     CountryCode2,
+    canonical_country_code,
     Unit,
 )
+from .data_handlers import EmissionFactors, get_registry
+
+# Number of distinct option combinations whose validated parameters are kept
+PARAMETER_CACHE_SIZE = 512
+
+
+class ParameterRule(NamedTuple):
+    """Rule on the combination of several parameters
+
+    The predicate is built from numpy functions, so it is evaluated element-wise on
+    arrays of parameter values as well as on single values. It compares enum values,
+    as numpy converts enum members to their names.
+    """
+
+    columns: tuple
+    violated: Callable
+    message: str
+
+    def check(self, values: dict) -> dict:
+        """Raises a ValueError if the values of a model violate the rule"""
+        if self.violated(*(values.get(column) for column in self.columns)):
+            raise ValueError(self.message)
+        return values
+
+
+TRAIN_COUNTRY_RULE = ParameterRule(
+    ("country_code", "vehicle_range"),
+    lambda country_code, vehicle_range: np.logical_and(
+        country_code != "global", vehicle_range != BusTrainRange.AVERAGE.value
+    ),
+    "If 'country_code' is specified, 'vehicle_range' must be 'average'.",
+)
+CAR_SIZE_RULE = ParameterRule(
+    ("size", "fuel_type"),
+    lambda size, fuel_type: np.logical_and(
+        size != Size.AVERAGE.value, fuel_type == CarFuel.AVERAGE.value
+    ),
+    "If 'size' is specified, 'fuel_type' must also be specified.",
+)
+BUS_ELECTRIC_RULE = ParameterRule(
+    ("fuel_type", "size", "vehicle_range"),
+    lambda fuel_type, size, vehicle_range: np.logical_and(
+        fuel_type == BusFuel.ELECTRIC.value,
+        np.logical_or(
+            size != Size.AVERAGE.value, vehicle_range != BusTrainRange.LOCAL.value
+        ),
+    ),
+    "If 'fuel_type' is 'electric', 'size' must be 'average' and 'vehicle_range' must be 'local'.",
+)
+BUS_CNG_RULE = ParameterRule(
+    ("fuel_type", "vehicle_range"),
+    lambda fuel_type, vehicle_range: np.logical_and(
+        fuel_type == BusFuel.CNG.value, vehicle_range != BusTrainRange.LOCAL.value
+    ),
+    "If 'fuel_type' is 'cng', 'vehicle_range' must be 'local'.",
+)
+BUS_DIESEL_RULE = ParameterRule(
+    ("fuel_type", "vehicle_range", "size"),
+    lambda fuel_type, vehicle_range, size: np.logical_and(
+        np.logical_and(
+            fuel_type == BusFuel.DIESEL.value,
+            vehicle_range == BusTrainRange.LONG_DISTANCE.value,
+        ),
+        np.logical_not(
+            np.logical_or(size == Size.SMALL.value, size == Size.LARGE.value)
+        ),
+    ),
+    "If 'fuel_type' is 'diesel' and 'vehicle_range' is 'long-distance', size must be 'small' or 'large'.",
+)
+OWN_SHARE_RULE = ParameterRule(
+    ("own_share",),
+    lambda own_share: np.logical_not(
+        np.logical_and(np.less_equal(0, own_share), np.less_equal(own_share, 1))
+    ),
+    "'own_share' must be between 0 and 1.",
+)
 
 
 class TrainEmissionParameters(BaseModel):
@@ -38,6 +120,12 @@ class TrainEmissionParameters(BaseModel):
             v = v.lower()
         return BusTrainRange(v)
 
+    @validator("country_code", allow_reuse=True)
+    def check_country_code(cls, v):
+        if str(v).lower() == "global":
+            return "global"
+        return canonical_country_code(v)
+
     @root_validator(pre=True)
     def validate_input_parameters(cls, values):
         allowed_keys = {"vehicle_range", "country_code"}
@@ -53,16 +141,8 @@ class TrainEmissionParameters(BaseModel):
 
     @root_validator
     def validate_country_code_and_range(cls, values):
-        country_code = values.get("country_code")
-        vehicle_range = values.get("vehicle_range")
-
-        # check if size is specified, fuel_type must also be specified
-        if country_code != "global" and vehicle_range != BusTrainRange.AVERAGE:
-            raise ValueError(
-                "If 'country_code' is specified, 'vehicle_range' must be 'average'."
-            )
-
-        return values
+        # check if country_code is specified, vehicle_range must be average
+        return TRAIN_COUNTRY_RULE.check(values)
 
 
 class TramEmissionParameters(BaseModel):
@@ -145,16 +225,8 @@ class CarEmissionParameters(BaseModel):
 
     @root_validator
     def validate_size_and_fuel_type(cls, values):
-        size = values.get("size")
-        fuel_type = values.get("fuel_type")
-
         # check if size is specified, fuel_type must also be specified
-        if size != Size.AVERAGE and fuel_type == CarFuel.AVERAGE:
-            raise ValueError(
-                "If 'size' is specified, 'fuel_type' must also be specified."
-            )
-
-        return values
+        return CAR_SIZE_RULE.check(values)
 
     @validator("fuel_type", allow_reuse=True)
     def check_fueltype(cls, v):
@@ -252,50 +324,18 @@ class BusEmissionParameters(BaseModel):
 
     @root_validator
     def validate_fuel_type_electric_with_size_and_range(cls, values):
-        size = values.get("size")
-        fuel_type = values.get("fuel_type")
-        vehicle_range = values.get("vehicle_range")
-
         # check if fuel_type is electric, size must be average and range must be local
-        if fuel_type == BusFuel.ELECTRIC and (
-            size != Size.AVERAGE or vehicle_range != BusTrainRange.LOCAL
-        ):
-            raise ValueError(
-                "If 'fuel_type' is 'electric', 'size' must be 'average' and 'vehicle_range' must be 'local'."
-            )
-
-        return values
+        return BUS_ELECTRIC_RULE.check(values)
 
     @root_validator
     def validate_fuel_type_cng_with_range(cls, values):
-        fuel_type = values.get("fuel_type")
-        vehicle_range = values.get("vehicle_range")
-
         # check if fuel_type is cng range must be local
-        if fuel_type == BusFuel.CNG and vehicle_range != BusTrainRange.LOCAL:
-            raise ValueError(
-                "If 'fuel_type' is 'cng', 'vehicle_range' must be 'local'."
-            )
-
-        return values
+        return BUS_CNG_RULE.check(values)
 
     @root_validator
     def validate_fuel_type_diesel_with_range_and_size(cls, values):
-        size = values.get("size")
-        fuel_type = values.get("fuel_type")
-        vehicle_range = values.get("vehicle_range")
-
         # check if fuel_type is diesel and vehicle_range is long-distance, size must be small or large
-        if (
-            fuel_type == BusFuel.DIESEL
-            and vehicle_range == BusTrainRange.LONG_DISTANCE
-            and size not in {Size.SMALL, Size.LARGE}
-        ):
-            raise ValueError(
-                "If 'fuel_type' is 'diesel' and 'vehicle_range' is 'long-distance', size must be 'small' or 'large'."
-            )
-
-        return values
+        return BUS_DIESEL_RULE.check(values)
 
     @validator("fuel_type", allow_reuse=True)
     def check_fueltype(cls, v):
@@ -362,7 +402,7 @@ class ElectricityEmissionParameters(BaseModel):
 
     @validator("own_share", allow_reuse=True)
     def check_own_share(cls, v):
-        assert 0 <= v <= 1
+        assert not OWN_SHARE_RULE.violated(v), OWN_SHARE_RULE.message
         return v
 
 
@@ -388,5 +428,264 @@ class HeatingEmissionParameters(BaseModel):
 
     @validator("own_share", allow_reuse=True)
     def check_own_share(cls, v):
-        assert 0 <= v <= 1
+        assert not OWN_SHARE_RULE.violated(v), OWN_SHARE_RULE.message
         return v
+
+
+class ParameterRecord:
+    """Methods of the immutable records which hold validated parameters
+
+    Records are named tuples, so they need much less memory than the parameter
+    classes and are hashable. They are used for calculations and their results, and
+    can be converted to the parameter class with to_model().
+    """
+
+    __slots__ = ()
+    model: type[BaseModel]
+
+    @classmethod
+    def from_model(cls, params: BaseModel) -> "ParameterRecord":
+        """Returns the record of validated parameters"""
+        return cls._make(getattr(params, field) for field in cls._fields)
+
+    def to_model(self) -> BaseModel:
+        """Returns the parameters as instance of the parameter class
+
+        Fields which the record leaves out are removed from the instance, too.
+        """
+        params = self.model.construct(**self._asdict())
+        for field in self.model.__fields__:
+            if field not in self._fields:
+                delattr(params, field)
+        return params
+
+    def dict(self) -> dict:
+        """Returns the parameters as dictionary, like BaseModel.dict()"""
+        return self._asdict()
+
+
+def _record_type(model: type[BaseModel], name: str, exclude: tuple = ()) -> type:
+    """Creates the record class for the fields of a parameter class"""
+    fields = [field for field in model.__fields__ if field not in exclude]
+    base = collections.namedtuple(name, fields)
+    return type(
+        name,
+        (base, ParameterRecord),
+        {"__slots__": (), "__module__": __name__, "model": model},
+    )
+
+
+TrainEmissionRecord = _record_type(TrainEmissionParameters, "TrainEmissionRecord")
+TramEmissionRecord = _record_type(TramEmissionParameters, "TramEmissionRecord")
+BicycleEmissionRecord = _record_type(BicycleEmissionParameters, "BicycleEmissionRecord")
+PedelecEmissionRecord = _record_type(PedelecEmissionParameters, "PedelecEmissionRecord")
+CarEmissionRecord = _record_type(CarEmissionParameters, "CarEmissionRecord")
+PlaneEmissionRecord = _record_type(PlaneEmissionParameters, "PlaneEmissionRecord")
+FerryEmissionRecord = _record_type(FerryEmissionParameters, "FerryEmissionRecord")
+BusEmissionRecord = _record_type(BusEmissionParameters, "BusEmissionRecord")
+MotorbikeEmissionRecord = _record_type(
+    MotorbikeEmissionParameters, "MotorbikeEmissionRecord"
+)
+ElectricityEmissionRecord = _record_type(
+    ElectricityEmissionParameters, "ElectricityEmissionRecord"
+)
+HeatingEmissionRecord = _record_type(HeatingEmissionParameters, "HeatingEmissionRecord")
+# Parameters of heating emissions, whose unit is given by the emissions instead
+HeatingResultRecord = _record_type(
+    HeatingEmissionParameters, "HeatingResultRecord", exclude=("in_kwh",)
+)
+
+RECORDS = {
+    record.model: record
+    for record in (
+        TrainEmissionRecord,
+        TramEmissionRecord,
+        BicycleEmissionRecord,
+        PedelecEmissionRecord,
+        CarEmissionRecord,
+        PlaneEmissionRecord,
+        FerryEmissionRecord,
+        BusEmissionRecord,
+        MotorbikeEmissionRecord,
+        ElectricityEmissionRecord,
+        HeatingEmissionRecord,
+    )
+}
+
+
+# Rules of each parameter class, which batch validation checks on whole columns
+RULES = {
+    TrainEmissionParameters: (TRAIN_COUNTRY_RULE,),
+    CarEmissionParameters: (CAR_SIZE_RULE,),
+    BusEmissionParameters: (BUS_ELECTRIC_RULE, BUS_CNG_RULE, BUS_DIESEL_RULE),
+    ElectricityEmissionParameters: (OWN_SHARE_RULE,),
+    HeatingEmissionParameters: (OWN_SHARE_RULE,),
+}
+
+
+class BatchValidation(NamedTuple):
+    """Result of the validation of a table of parameters"""
+
+    parameters: pd.DataFrame
+    invalid: np.ndarray
+    messages: np.ndarray
+
+
+def validate_many(
+    model: type[BaseModel], parameters: pd.DataFrame | dict
+) -> BatchValidation:
+    """Validates a table of parameters with the rules of a parameter class
+
+    The field validators of the class run once per distinct value of a column, and
+    the rules on combinations of parameters are evaluated on whole columns. Missing
+    values (None or NaN) take the default of the field.
+
+    :param model: Parameter class, e.g. CarEmissionParameters
+    :param parameters: Parameters, one row per calculation
+    :type model: type[BaseModel]
+    :type parameters: pd.DataFrame | dict
+    :return: Validated parameters with all fields of the class, whether each row is
+        invalid, and the error messages of each row (None if it is valid)
+    :rtype: BatchValidation
+    """
+    frame = pd.DataFrame(parameters)
+    n_rows = len(frame)
+    errors = []
+
+    # Classes with a pre root validator only accept their input parameters
+    if model.__pre_root_validators__:
+        allowed = set(model.__fields__) - {"category", "subcategory"}
+        invalid_columns = set(frame.columns) - allowed
+        if invalid_columns:
+            errors.append(
+                (
+                    np.ones(n_rows, dtype=bool),
+                    f"Invalid parameter(s): {', '.join(sorted(invalid_columns))}.",
+                )
+            )
+
+    columns = {}
+    invalid_fields = np.zeros(n_rows, dtype=bool)
+    for name, field in model.__fields__.items():
+        if name not in frame.columns:
+            columns[name] = np.empty(n_rows, dtype=object)
+            columns[name].fill(field.default)
+            continue
+        column = frame[name]
+        if field.type_ is float and pd.api.types.is_numeric_dtype(column):
+            # Numbers need no conversion, their ranges are checked by the rules
+            columns[name] = column.fillna(field.default).to_numpy(dtype=float)
+            continue
+        codes, uniques = pd.factorize(column)
+        values = np.empty(len(uniques) + 1, dtype=object)
+        valid = np.ones(len(uniques) + 1, dtype=bool)
+        for i, value in enumerate(uniques):
+            values[i], error = field.validate(value, {}, loc=name, cls=model)
+            valid[i] = error is None
+            if error is not None:
+                errors.append((codes == i, f"Invalid value of '{name}': {value!r}."))
+        values[-1] = field.default
+        columns[name] = values[codes]
+        invalid_fields |= ~valid[codes]
+
+    for rule in RULES.get(model, ()):
+        violated = rule.violated(*(columns[column] for column in rule.columns))
+        # Rules are only checked for rows whose fields are valid
+        errors.append(
+            (np.asarray(violated, dtype=bool) & ~invalid_fields, rule.message)
+        )
+
+    invalid = np.zeros(n_rows, dtype=bool)
+    messages = np.full(n_rows, None, dtype=object)
+    for rows, message in errors:
+        invalid |= rows
+        messages[rows] = [
+            message if previous is None else f"{previous} {message}"
+            for previous in messages[rows]
+        ]
+    return BatchValidation(pd.DataFrame(columns, index=frame.index), invalid, messages)
+
+
+def _normalize_option(value):
+    """Returns the value of enums and strings in lower case, as the models compare"""
+    value = getattr(value, "value", value)
+    return value.lower() if isinstance(value, str) else value
+
+
+@functools.lru_cache(maxsize=PARAMETER_CACHE_SIZE)
+def _parse_cached(
+    model: type[BaseModel],
+    options: tuple,
+    emission_factors: Union[EmissionFactors, weakref.ref],
+    resolve: bool,
+) -> tuple[ParameterRecord, float]:
+    """Validates options and looks up their emission factor, see parse_with_factor()
+
+    Cached calls take a weak reference to the emission factors, so that the cache
+    does not keep reloaded tables alive.
+    """
+    if isinstance(emission_factors, weakref.ref):
+        emission_factors = emission_factors()
+    params = model.parse_obj(dict(options))
+    record = RECORDS[model].from_model(params)
+    if not resolve:
+        return record, emission_factors.get(params.dict())
+
+    resolution = emission_factors.resolve(params.dict())
+    # Record the values the factor was found with instead of those which fell back
+    fallbacks = {}
+    for name in resolution.fallbacks:
+        value, _ = model.__fields__[name].validate(
+            resolution.parameters[name], {}, loc=name
+        )
+        fallbacks[name] = value
+    return record._replace(**fallbacks), resolution.factor
+
+
+def parse_with_factor(
+    model: type[BaseModel],
+    options: Union[BaseModel, dict],
+    emission_factors: EmissionFactors = None,
+    resolve: bool = False,
+) -> tuple[ParameterRecord, float]:
+    """Validates options and looks up the emission factor of the parameters
+
+    The results of the most recent option combinations are cached, so repeated
+    combinations are neither validated nor looked up again. Options are compared
+    after taking the value of enums and lower-casing strings, e.g. "Diesel" and
+    CarFuel.DIESEL share an entry. The cache is bound to the emission factors, so
+    reloaded factors are looked up anew, without keeping the previous ones in memory.
+    The parameters are returned as immutable record, see ParameterRecord.
+
+    :param model: Parameter class to validate the options with
+    :param options: Options of the calculation
+    :param emission_factors: Emission factors, those of the registry by default
+    :param resolve: Fall back to more general parameters, see EmissionFactors.resolve().
+        The returned parameters then hold the values of the fallbacks which were used,
+        e.g. the global country code instead of a country without factor.
+    :type model: type[BaseModel]
+    :type options: Union[BaseModel, dict]
+    :type emission_factors: EmissionFactors
+    :type resolve: bool
+    :return: Validated parameters and co2e factor
+    :rtype: tuple[ParameterRecord, float]
+    """
+    if emission_factors is None:
+        emission_factors = get_registry().emission_factors
+    try:
+        key = tuple(sorted((k, _normalize_option(v)) for k, v in options.items()))
+        hash(key)
+    except (AttributeError, TypeError):
+        # Options which are not a dict of hashable values are not cached
+        return _parse_cached.__wrapped__(model, options, emission_factors, resolve)
+    return _parse_cached(model, key, weakref.ref(emission_factors), resolve)
+
+
+def parameter_cache_info():
+    """Returns hits, misses, maximum and current size of the parameter cache"""
+    return _parse_cached.cache_info()
+
+
+def clear_parameter_cache() -> None:
+    """Clears the parameter cache"""
+    _parse_cached.cache_clear()
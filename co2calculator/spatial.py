@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Spatial index for nearest neighbour queries on the sphere"""
+
+import numpy as np
+
+from .distances import (
+    EARTH_RADIUS,
+    MATRIX_CHUNK_SIZE,
+    NearestDistances,
+    _coordinate_arrays,
+)
+
+# Default edge length of the finest grid cells in degrees
+CELL_SIZE = 2.0
+# Factor between the cell sizes of consecutive grids
+CELL_SIZE_STEP = 3
+
+
+def _unit_vectors(lat: np.ndarray, long: np.ndarray) -> np.ndarray:
+    """Convert coordinates in degrees to points on the unit sphere"""
+    lat = np.deg2rad(lat)
+    long = np.deg2rad(long)
+    return np.stack(
+        [np.cos(lat) * np.cos(long), np.cos(lat) * np.sin(long), np.sin(lat)], axis=-1
+    )
+
+
+class _Grid:
+    def __init__(self, lat: np.ndarray, long: np.ndarray, cell_size: float):
+        """Divide the sphere into cells of cell_size degrees of latitude and longitude
+
+        Every cell keeps the points of itself and its eight neighbours as candidates.
+        All points within the reach of a location are candidates of its cell.
+        """
+        self.rows = int(np.ceil(180 / cell_size))
+        self.columns = int(np.ceil(360 / cell_size))
+
+        # Pair every point with the cell itself and the cells around it
+        row, column = divmod(self.cell(lat, long), self.columns)
+        cells, members = [], []
+        for row_offset in (-1, 0, 1):
+            neighbour_row = row + row_offset
+            valid = (neighbour_row >= 0) & (neighbour_row < self.rows)
+            for column_offset in (-1, 0, 1):
+                neighbour_column = (column + column_offset) % self.columns
+                cells.append((neighbour_row * self.columns + neighbour_column)[valid])
+                members.append(np.flatnonzero(valid))
+        cells = np.concatenate(cells)
+        members = np.concatenate(members)
+        order = np.lexsort((members, cells))
+        cells, members = cells[order], members[order]
+
+        # Candidates of the occupied cells, padded with -1
+        occupied, starts, counts = np.unique(
+            cells, return_index=True, return_counts=True
+        )
+        self.candidates = np.full((len(occupied), counts.max()), -1, dtype=np.int32)
+        self.candidates[
+            np.repeat(np.arange(len(occupied)), counts),
+            np.arange(len(cells)) - np.repeat(starts, counts),
+        ] = members
+        self.cell_candidates = np.full(self.rows * self.columns, -1, dtype=np.int32)
+        self.cell_candidates[occupied] = np.arange(len(occupied))
+        self.counts = counts
+
+        # Locations outside the neighbouring rows are at least one row height away.
+        # Locations outside the neighbouring columns are at least as far as the
+        # meridian one column width away, which comes closer towards the poles.
+        height = np.deg2rad(180 / self.rows)
+        width = np.deg2rad(360 / self.columns)
+        bottom = -np.pi / 2 + height * np.arange(self.rows)
+        top = np.minimum(bottom + height, np.pi / 2)
+        pole_distance = np.minimum(np.pi / 2 - np.abs(bottom), np.pi / 2 - np.abs(top))
+        reach = np.minimum(height, np.arcsin(np.sin(pole_distance) * np.sin(width)))
+        # Compare squared chord lengths on the unit sphere instead of angles
+        self.row_reach = (2 * np.sin(reach / 2)) ** 2
+
+    def cell(self, lat: np.ndarray, long: np.ndarray) -> np.ndarray:
+        """Returns the grid cells of coordinates"""
+        row = np.minimum(((lat + 90) / 180 * self.rows).astype(np.int64), self.rows - 1)
+        column = ((long + 180) / 360 * self.columns).astype(np.int64) % self.columns
+        return row * self.columns + column
+
+
+class SphericalIndex:
+    def __init__(self, lat: np.ndarray, long: np.ndarray, cell_size: float = CELL_SIZE):
+        """Build an index over points given by their coordinates for nearest queries
+
+        The index consists of grids whose cells grow from cell_size by a factor of
+        CELL_SIZE_STEP up to 45 degrees. A query measures the distances to the
+        candidates of its cell in the finest grid and moves on to the next grid if the
+        k-th nearest candidate is not within the reach of that cell (e.g., in sparse
+        regions or near the poles). Queries which are not answered by any grid are
+        compared to all points, so results are exact.
+
+        Raises:
+        - InvalidCoordinateInput if a coordinate is out of range
+        - ValueError if there are no points or the cell size is not between 0 and 45
+        :param lat: Latitudes of the points
+        :param long: Longitudes of the points
+        :param cell_size: Edge length of the cells of the finest grid in degrees
+        :type lat: np.ndarray
+        :type long: np.ndarray
+        :type cell_size: float
+        """
+        lat, long = _coordinate_arrays(lat, long)
+        if len(lat) == 0:
+            raise ValueError("A spatial index needs at least one point")
+        if not 0 < cell_size <= 45:
+            raise ValueError(f"Cell size must be between 0 and 45. Got: {cell_size}")
+
+        self._points = _unit_vectors(lat, long)
+        self._grids = []
+        while cell_size <= 45:
+            self._grids.append(_Grid(lat, long, cell_size))
+            cell_size *= CELL_SIZE_STEP
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def query(self, lat: np.ndarray, long: np.ndarray, k: int = 1) -> NearestDistances:
+        """Find the k nearest points of every location
+
+        Raises:
+        - InvalidCoordinateInput if a coordinate is out of range
+        - ValueError if k is less than 1
+        :param lat: Latitudes of the locations
+        :param long: Longitudes of the locations
+        :param k: Number of points per location (at most the number of points)
+        :type lat: np.ndarray
+        :type long: np.ndarray
+        :type k: int
+        :return: Indices of the points and their distances in km, sorted by distance
+        :rtype: NearestDistances
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1. Got: {k}")
+        lat, long = _coordinate_arrays(lat, long)
+        k = min(k, len(self._points))
+        queries = _unit_vectors(lat, long)
+
+        indices = np.empty((len(lat), k), dtype=np.int64)
+        chords = np.empty((len(lat), k))
+        pending = np.arange(len(lat))
+        for grid in self._grids:
+            cells = grid.cell(lat[pending], long[pending])
+            candidate_rows = grid.cell_candidates[cells]
+            # Cells with fewer than k candidates cannot answer the query
+            counts = np.where(candidate_rows >= 0, grid.counts[candidate_rows], 0)
+            searched = counts >= k
+            # Search locations with similar numbers of candidates together, so
+            # that little padding of candidates is compared
+            order = np.argsort(counts[searched], kind="stable")
+            rows = pending[searched][order]
+            cells, candidate_rows = (
+                cells[searched][order],
+                candidate_rows[searched][order],
+            )
+            counts = counts[searched][order]
+            answered = np.zeros(len(rows), dtype=bool)
+            start = 0
+            while start < len(rows):
+                # Largest block whose padded candidates fit into a chunk
+                window = counts[start : start + MATRIX_CHUNK_SIZE // k]
+                size = np.arange(1, len(window) + 1) * window
+                stop = start + max(1, np.searchsorted(size, MATRIX_CHUNK_SIZE, "right"))
+                block = slice(start, stop)
+                candidates = grid.candidates[candidate_rows[block], : counts[stop - 1]]
+                query_rows = rows[block]
+                dots = np.einsum(
+                    "ijk,ik->ij", self._points[candidates], queries[query_rows]
+                )
+                dots[candidates < 0] = -np.inf
+                indices[query_rows], chords[query_rows] = self._nearest(
+                    queries[query_rows], candidates, dots, k
+                )
+                answered[block] = (
+                    chords[query_rows, -1]
+                    <= grid.row_reach[cells[block] // grid.columns]
+                )
+                start = stop
+            pending = np.sort(np.concatenate([pending[~searched], rows[~answered]]))
+
+        # Compare the remaining locations to all points
+        step = max(1, MATRIX_CHUNK_SIZE // len(self._points))
+        everything = np.arange(len(self._points), dtype=np.int32)
+        for start in range(0, len(pending), step):
+            rows = pending[start : start + step]
+            candidates = np.broadcast_to(everything, (len(rows), len(everything)))
+            indices[rows], chords[rows] = self._nearest(
+                queries[rows], candidates, queries[rows] @ self._points.T, k
+            )
+
+        return NearestDistances(
+            indices, 2 * np.arcsin(np.minimum(np.sqrt(chords) / 2, 1.0)) * EARTH_RADIUS
+        )
+
+    def _nearest(
+        self, queries: np.ndarray, candidates: np.ndarray, dots: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Select the k nearest candidates of every query
+
+        Candidates are selected by their dot product with the query, which is
+        computed at once, and then ordered by their exact squared chord length.
+
+        :return: Indices of the nearest candidates and their squared chord lengths
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        selected = np.argpartition(-dots, k - 1, axis=1)[:, :k]
+        selected = np.take_along_axis(candidates, selected, axis=1)
+        selected_chords = ((self._points[selected] - queries[:, None, :]) ** 2).sum(-1)
+        # Padding (-1) of candidates is only selected if there are too few candidates
+        selected_chords[selected < 0] = np.inf
+        order = np.argsort(selected_chords, axis=1, kind="stable")
+        return (
+            np.take_along_axis(selected, order, axis=1),
+            np.take_along_axis(selected_chords, order, axis=1),
+        )
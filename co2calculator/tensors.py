@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Emission factor tables compiled into tensors indexed by integer enum codes"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .constants import (
+    COUNTRY_CODES,
+    BusFuel,
+    BusTrainRange,
+    CarFuel,
+    CodedEnum,
+    ElectricityFuel,
+    FerryClass,
+    FlightClass,
+    FlightRange,
+    HeatingFuel,
+    Size,
+    TrainFuel,
+    TransportationMode,
+)
+from .data_handlers import FactorStatus
+
+# Fuel types and ranges are described by a different enum for each transportation mode.
+# Modes without a parameter enum list the values of the factor table.
+_FUEL_ENUMS = {
+    TransportationMode.CAR: CarFuel,
+    TransportationMode.BUS: BusFuel,
+    TransportationMode.TRAIN: TrainFuel,
+    TransportationMode.TRAM: TrainFuel,
+    TransportationMode.PLANE: ("kerosine",),
+}
+_RANGE_ENUMS = {
+    TransportationMode.BUS: BusTrainRange,
+    TransportationMode.TRAIN: BusTrainRange,
+    TransportationMode.TRAM: BusTrainRange,
+    TransportationMode.PLANE: FlightRange,
+}
+
+
+@dataclass(frozen=True)
+class Axis:
+    """Axis of a factor tensor
+
+    The vocabulary of an axis is either an enum, a mapping of transportation modes to
+    enums or a tuple of values. Its codes are the enum codes or the tuple positions.
+    """
+
+    column: str
+    vocabulary: type[CodedEnum] | dict | tuple
+
+    @property
+    def size(self) -> int:
+        """Number of codes of the axis"""
+        if isinstance(self.vocabulary, dict):
+            return max(len(vocabulary) for vocabulary in self.vocabulary.values())
+        return len(self.vocabulary)
+
+    def code(self, value, mode=None) -> int | None:
+        """Returns the code of a value, or None if the axis has no code for it
+
+        :param value: Value of the axis column
+        :param mode: Transportation mode, for axes with an enum per mode
+        :return: Integer code
+        :rtype: int | None
+        """
+        vocabulary = self.vocabulary
+        if isinstance(vocabulary, dict):
+            vocabulary = vocabulary.get(mode)
+            if vocabulary is None:
+                return None
+        if hasattr(value, "value"):
+            value = value.value
+        if isinstance(vocabulary, tuple):
+            return vocabulary.index(value) if value in vocabulary else None
+        try:
+            return vocabulary(value).code
+        except ValueError:
+            return None
+
+
+AXES = {
+    "transport": (
+        Axis("subcategory", TransportationMode),
+        Axis("fuel_type", _FUEL_ENUMS),
+        Axis("size", Size),
+        Axis("vehicle_range", _RANGE_ENUMS),
+        Axis("seating", FlightClass),
+        Axis("ferry_class", FerryClass),
+        Axis("country_code", COUNTRY_CODES),
+    ),
+    "electricity": (
+        Axis("fuel_type", ElectricityFuel),
+        Axis("country_code", COUNTRY_CODES),
+    ),
+    "heating": (
+        Axis("fuel_type", HeatingFuel),
+        Axis("country_code", COUNTRY_CODES),
+    ),
+}
+
+
+class FactorTensor:
+    def __init__(self, table: pd.DataFrame, axes: tuple[Axis, ...]):
+        """Compile an emission factor table into a tensor
+
+        The tensor has one axis per search column and one extra position per axis,
+        addressed by code -1, for a parameter which is not given. Every cell holds the
+        factor that EmissionFactors.get() finds for the same parameters. Codes of fuel
+        types and ranges differ between transportation modes, so there are no cells
+        which give them without a mode. Only cells with at least one matching factor
+        are stored, as sorted flat positions.
+
+        :param table: Emission factor table of one category
+        :param axes: Axes of the tensor
+        :type table: pd.DataFrame
+        :type axes: tuple[Axis, ...]
+        """
+        self.axes = axes
+        self.shape = tuple(axis.size + 1 for axis in axes)
+
+        has_modes = axes[0].column == "subcategory"
+        self._mode_axes = tuple(
+            i for i, axis in enumerate(axes) if isinstance(axis.vocabulary, dict)
+        )
+        cells = {}
+        for row in table[[axis.column for axis in axes] + ["co2e"]].itertuples(
+            index=False
+        ):
+            mode = row[0] if has_modes else None
+            codes = [
+                None if pd.isna(value) else axis.code(value, mode)
+                for axis, value in zip(axes, row)
+            ]
+            for axis, value, code in zip(axes, row, codes):
+                if code is None and not pd.isna(value):
+                    raise ValueError(
+                        f"No code for {axis.column} '{value}' of {mode or 'the table'}"
+                        ", please add it to the vocabulary of the axis."
+                    )
+            given = [i for i, code in enumerate(codes) if code is not None]
+            # A row matches every query that gives any subset of its values
+            for subset in range(2 ** len(given)):
+                position = [size - 1 for size in self.shape]
+                for bit, i in enumerate(given):
+                    if subset >> bit & 1:
+                        position[i] = codes[i]
+                if position[0] == self.shape[0] - 1 and any(
+                    position[i] < self.shape[i] - 1 for i in self._mode_axes
+                ):
+                    # Codes of these axes have no meaning without a mode
+                    continue
+                cell = np.ravel_multi_index(position, self.shape)
+                count, _ = cells.get(cell, (0, None))
+                cells[cell] = (count + 1, row[-1])
+
+        self._cells = np.array(sorted(cells), dtype=np.int64)
+        counts = np.array([cells[cell][0] for cell in self._cells], dtype=np.int64)
+        self._factors = np.array(
+            [cells[cell][1] if cells[cell][0] == 1 else np.nan for cell in self._cells]
+        )
+        self._status = np.where(
+            counts == 1, FactorStatus.FOUND, FactorStatus.AMBIGUOUS
+        ).astype(np.int8)
+
+    def __getitem__(self, codes: tuple) -> np.ndarray:
+        """Returns the factors for codes given in axis order, NaN if not unique"""
+        if not isinstance(codes, tuple):
+            codes = (codes,)
+        return self.lookup(**{axis.column: c for axis, c in zip(self.axes, codes)})[0]
+
+    def lookup(self, **codes) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the factors for arrays of codes, keyed by axis column
+
+        Axes without codes are treated as parameters which are not given. Code arrays
+        are broadcast against each other.
+
+        Raises:
+        - ValueError if a fuel type or range is given without a transportation mode
+        :return: co2e factors (NaN if no unique factor was found) and FactorStatus
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        arrays = np.broadcast_arrays(
+            *(
+                np.asarray(codes.get(axis.column, -1), dtype=np.int64)
+                for axis in self.axes
+            )
+        )
+        for i in self._mode_axes:
+            if np.any((arrays[0] < 0) & (arrays[i] >= 0)):
+                raise ValueError(
+                    f"Codes of {self.axes[i].column} depend on the transportation "
+                    "mode, please give a subcategory."
+                )
+        valid = np.ones(arrays[0].shape, dtype=bool)
+        for array, size in zip(arrays, self.shape):
+            valid &= (array >= -1) & (array < size - 1)
+        positions = [
+            np.where(array < 0, size - 1, array) * valid
+            for array, size in zip(arrays, self.shape)
+        ]
+        cells = np.ravel_multi_index(positions, self.shape)
+
+        found = np.searchsorted(self._cells, cells)
+        found = np.minimum(found, len(self._cells) - 1)
+        hit = valid & (self._cells[found] == cells)
+        factors = np.where(hit, self._factors[found], np.nan)
+        status = np.where(hit, self._status[found], FactorStatus.NOT_FOUND)
+        return factors, status.astype(np.int8)
+
+    def encode(self, parameters: pd.DataFrame | dict) -> dict[str, np.ndarray]:
+        """Convert columns of parameter values into arrays of codes
+
+        Missing values (None or NaN) become -1. Values without a code become a code
+        outside the axis, for which no factor is found.
+
+        :param parameters: Parameter values, one row per query
+        :type parameters: pd.DataFrame | dict
+        :return: Code arrays, keyed by axis column
+        :rtype: dict[str, np.ndarray]
+        """
+        frame = pd.DataFrame(parameters)
+        no_modes = pd.Series([None] * len(frame), dtype=object)
+        mode_keys, modes = pd.factorize(frame.get("subcategory", no_modes))
+        modes = [None] + list(modes)
+        codes = {}
+        for axis in self.axes:
+            if axis.column not in frame.columns:
+                continue
+            value_keys, values = pd.factorize(frame[axis.column])
+            keys = value_keys.astype(np.int64)
+            if isinstance(axis.vocabulary, dict):
+                keys = keys * len(modes) + mode_keys + 1
+            # Convert each distinct value (and mode) only once
+            keys, inverse = np.unique(keys, return_inverse=True)
+            unique_codes = np.empty(len(keys), dtype=np.int64)
+            for i, key in enumerate(keys):
+                value_key, mode_key = divmod(key, len(modes))
+                if not isinstance(axis.vocabulary, dict):
+                    value_key, mode_key = key, 0
+                if value_key < 0:
+                    unique_codes[i] = -1
+                    continue
+                code = axis.code(values[value_key], modes[mode_key])
+                unique_codes[i] = axis.size if code is None else code
+            codes[axis.column] = unique_codes[inverse.reshape(-1)]
+        return codes
@@ -5,6 +5,7 @@ import pytest
 
 from co2calculator.api.energy import Energy
 from co2calculator.api.emission import Emissions
+from co2calculator.parameters import HeatingEmissionParameters
 
 
 def test_instantiate_energy():
@@ -69,3 +70,20 @@ def test_calculation_heating_in_kwh():
     )
     assert isinstance(energy, Emissions)
     assert energy.co2e == pytest.approx(54.0, rel=0.01)
+
+
+def test_calculation_heating_mixed_case_fuel_type():
+    """Test whether fuel types are matched regardless of case"""
+    energy = Energy().from_heating(consumption=100, fuel_type="Oil").calculate_co2e()
+    expected = Energy().from_heating(consumption=100, fuel_type="oil").calculate_co2e()
+    assert energy.co2e == pytest.approx(expected.co2e)
+    assert energy.unit == expected.unit == "l"
+
+
+def test_calculation_heating_parameters_are_model():
+    """Test whether the emission parameters are returned as parameter class"""
+    energy = Energy().from_heating(consumption=100, fuel_type="oil").calculate_co2e()
+    assert isinstance(energy.emission_parameters, HeatingEmissionParameters)
+    assert "in_kwh" not in energy.emission_parameters.json()
+    energy.emission_parameters.own_share = 0.5
+    assert energy.emission_parameters.own_share == 0.5
@@ -7,6 +7,7 @@ import os
 from co2calculator import TransportationMode
 from co2calculator.api.emission import Emissions
 from co2calculator.api.trip import Trip
+from co2calculator.parameters import CarEmissionParameters
 
 
 def prepare():
@@ -70,6 +71,12 @@ def test_trip_by_train_calculation():
     assert isinstance(emissions.co2e, float)
 
 
+def test_trip_by_train_with_country_calculation():
+    """Test whether train emissions are calculated with a country specific factor"""
+    emissions = Trip(300).by_train(country_code="DE").calculate_co2e()
+    assert emissions.emission_factor == pytest.approx(0.0408)
+
+
 def test_trip_by_train_distance_calculation():
     """Test whether distance is calculated"""
     prepare()
@@ -380,3 +387,31 @@ def test_return_coords_in_TransportEmissions():
     assert isinstance(trip.destination_coords, tuple)
     assert trip.start_coords == pytest.approx((8.675858, 49.404381), 0.1)
     assert trip.destination_coords == pytest.approx((13.369406, 52.525083), 0.1)
+
+
+def test_trip_get_options():
+    """Test if the options of trips are the valid combinations of the factor tables"""
+    options = Trip(100).by_bus(fuel_type="electric").get_options()
+    assert options == {
+        "fuel_type": ["cng", "diesel", "electric"],
+        "size": ["average"],
+        "vehicle_range": ["local"],
+    }
+
+    options = Trip(100).by_train(country_code="DEU").get_options()
+    assert options["vehicle_range"] == ["average"]
+    assert "DE" in options["country_code"]
+
+    assert "small" in Trip(100).by_car().get_options()["size"]
+    # Values are matched regardless of case
+    options = Trip(10).by_car(fuel_type="DIESEL", size="Small").get_options()
+    assert options == Trip(10).by_car(fuel_type="diesel", size="small").get_options()
+    assert "diesel" in options["fuel_type"] and "small" in options["size"]
+    assert Trip(100).by_tram().get_options() == {}
+
+
+def test_trip_parameters_are_model():
+    """Test if the emission parameters of a trip are returned as parameter class"""
+    emissions = Trip(100).by_car(fuel_type="diesel", size="small").calculate_co2e()
+    assert isinstance(emissions.emission_parameters, CarEmissionParameters)
+    assert emissions.emission_parameters.copy(update={"passengers": 2}).passengers == 2
@@ -23,6 +23,24 @@ def test_heating_woodchips(
     assert co2e == pytest.approx(co2e_kg_expected, rel=0.01)
 
 
+@pytest.mark.parametrize(
+    "func_options,unit_expected",
+    [
+        pytest.param({"fuel_type": "Oil"}, "l"),
+        pytest.param({"fuel_type": "oil", "in_kwh": True}, "kWh"),
+    ],
+)
+def test_heating_with_unit(func_options: dict, unit_expected: str):
+    """Test if heating emissions are returned with the unit of the consumption"""
+
+    co2e, _, _, unit = energy.calc_co2_heating_with_unit(
+        consumption=100, options=func_options
+    )
+
+    assert unit == unit_expected
+    assert co2e == energy.calc_co2_heating(consumption=100, options=func_options)[0]
+
+
 @pytest.mark.parametrize(
     "consumption_kwh,func_options,co2e_kg_expected",
     [
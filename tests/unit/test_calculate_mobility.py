@@ -4,12 +4,14 @@
 
 from typing import Optional
 
+import numpy as np
 from pydantic import ValidationError
 import pytest
 from pytest_mock import MockerFixture
 
 import co2calculator.mobility.calculate_mobility as mobility
 
+from co2calculator.constants import FlightRange
 from co2calculator.exceptions import ConversionFactorNotFound, EmissionFactorNotFound
 
 
@@ -125,6 +127,49 @@ def test_calc_co2_train(
     assert isinstance(actual_emissions[0], float)
 
 
+@pytest.mark.parametrize(
+    "options,expected_factor,expected_country_code",
+    [
+        pytest.param(
+            {"country_code": "DE", "vehicle_range": "average"}, 0.0408, "DE", id="DE"
+        ),
+        pytest.param(
+            {"country_code": "PL", "vehicle_range": "average"},
+            0.007,
+            "global",
+            id="no factor for PL, falls back to global",
+        ),
+        pytest.param(
+            {"country_code": "de", "vehicle_range": "average"}, 0.0408, "DE", id="de"
+        ),
+        pytest.param(
+            {"country_code": "DEU", "vehicle_range": "average"}, 0.0408, "DE", id="DEU"
+        ),
+    ],
+)
+def test_calc_co2_train_country(
+    options: dict, expected_factor: float, expected_country_code: str
+):
+    """Test: Calculate train-trip emissions for a given country.
+    Expect: Uses the global emission factor if there is none for the country,
+    and records the fallback in the parameters.
+    """
+    _, co2e_factor, params = mobility.calc_co2_train(distance=100, options=options)
+
+    assert co2e_factor == pytest.approx(expected_factor)
+    assert params.country_code == expected_country_code
+
+
+def test_calc_co2_train_invalid_country():
+    """Test: Calculate train-trip emissions for an invalid country code.
+    Expect: Raises an error instead of using the global emission factor.
+    """
+    with pytest.raises(ValidationError):
+        mobility.calc_co2_train(
+            distance=100, options={"country_code": "XX", "vehicle_range": "average"}
+        )
+
+
 @pytest.mark.parametrize(
     "distance,options,expected_emissions",
     [
@@ -181,3 +226,18 @@ def test_calc_co2_plane__invalid_distance_seating_combo() -> None:
 #    """
 #    actual_emissions = mobility.calc_co2_ferry(distance=100, options=options)
 #    assert isinstance(actual_emissions[0], float)
+
+
+def test_flight_range_codes():
+    """Test if arrays of flight distances are classified as short or long haul"""
+    codes = mobility.flight_range_codes(np.array([100, 3700, 3701]))
+    assert [FlightRange.from_code(code) for code in codes] == [
+        FlightRange.SHORT_HAUL,
+        FlightRange.SHORT_HAUL,
+        FlightRange.LONG_HAUL,
+    ]
+
+    # Single flights are classified alike
+    for distance, code in zip([100, 3700, 3701], codes):
+        _, _, params = mobility.calc_co2_plane(distance)
+        assert params.vehicle_range == FlightRange.from_code(code)
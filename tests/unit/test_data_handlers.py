@@ -2,10 +2,31 @@
 # -*- coding: utf-8 -*-
 """Test data handlers"""
 
+import pickle
+import shutil
+import threading
 from pathlib import Path
 import pytest
-from co2calculator.data_handlers import EmissionFactors, Airports, EUTrainStations
+from co2calculator.data_handlers import (
+    EmissionFactors,
+    Airports,
+    EUTrainStations,
+    FactorStatus,
+    FactorRegistry,
+    ConversionFactors,
+    VersionedEmissionFactors,
+    get_airports,
+    get_registry,
+    load_tables,
+    script_path,
+    set_registry,
+)
+import co2calculator.data_handlers as data_handlers
+import co2calculator.mobility.calculate_mobility as mobility
+from co2calculator.constants import HeatingFuel, Unit
 from co2calculator import emission_factors
+from co2calculator.exceptions import EmissionFactorNotFound, ConversionFactorNotFound
+import numpy as np
 import pandas as pd
 
 
@@ -39,6 +60,487 @@ def test_load_airports(airports_test):
     assert isinstance(airports_test.airports, pd.DataFrame)
 
 
+def test_get_airport(airports_test):
+    """Test if airports are found by their IATA code"""
+    airport = airports_test.get("FRA")
+    assert airport.name == "Frankfurt Airport"
+    assert airport.country == "DE"
+    assert airport.latitude == pytest.approx(50.03, abs=0.01)
+    assert "EAP" not in airports_test
+    with pytest.raises(ValueError):
+        airports_test.get("EAP")
+    # The country code of Namibia is not read as a missing value
+    assert airports_test.get("WDH").country == "NA"
+    assert get_airports() is get_airports()
+
+
+def test_nearest_airports(airports_test):
+    """Test if the nearest commercial airports of coordinates are found"""
+    # Frankfurt main station and Hamburg city hall
+    nearest = airports_test.nearest([50.107, 53.551], [8.663, 9.992], k=2)
+    assert nearest.iata_codes.shape == (2, 2)
+    assert nearest.iata_codes[0, 0] == "FRA"
+    assert nearest.iata_codes[1, 0] == "HAM"
+    assert np.all(np.diff(nearest.distances, axis=1) >= 0)
+    # Airfields without scheduled flights are only found when asked for
+    nearest = airports_test.nearest(49.41, 8.69, commercial=False)
+    assert nearest.distances[0, 0] < 10
+
+
 def test_load_train_stations(eu_train_stations_test):
     """Test if the train stations are loaded correctly"""
     assert isinstance(eu_train_stations_test.stations, pd.DataFrame)
+
+
+def test_nearest_train_stations(mocker):
+    """Test if coordinates are snapped to the nearest (main) train stations"""
+    stations = pd.DataFrame(
+        {
+            "id": [1, 2, 3, 4],
+            "name": ["Heidelberg Hbf", "Heidelberg-Weststadt", "Mannheim Hbf", "Basel"],
+            "slug": ["heidelberg", "weststadt", "mannheim", "basel"],
+            "latitude": [49.4038, 49.3995, 49.4794, np.nan],
+            "longitude": [8.6758, 8.6864, 8.4696, np.nan],
+            "country": ["DE", "DE", "DE", "CH"],
+            "is_main_station": ["t", "f", "t", "t"],
+        }
+    )
+    mocker.patch("co2calculator.data_handlers.pd.read_csv", return_value=stations)
+    train_stations = EUTrainStations()
+
+    # A location next to Heidelberg-Weststadt
+    nearest = train_stations.nearest([49.3990, 49.48], [8.6870, 8.47], k=2)
+    assert nearest.names.tolist() == [
+        ["Heidelberg Hbf", "Mannheim Hbf"],
+        ["Mannheim Hbf", "Heidelberg Hbf"],
+    ]
+    assert nearest.countries[0, 0] == "DE"
+    assert np.allclose(nearest.coordinates[0, 0], (8.6758, 49.4038))
+    assert np.all(nearest.distances[:, 0] < 1)
+    nearest = train_stations.nearest(49.3990, 8.6870, main_stations=False)
+    assert nearest.names[0, 0] == "Heidelberg-Weststadt"
+
+
+def test_get_emission_factor_from_index():
+    """Test if the indexed lookup returns the factor of the matching row"""
+    parameters = {
+        "category": "transport",
+        "subcategory": "car",
+        "fuel_type": "diesel",
+        "size": "small",
+        "passengers": 2,
+    }
+    assert emission_factors.get(parameters) == pytest.approx(0.1109)
+
+
+@pytest.mark.parametrize(
+    "parameters,message",
+    [
+        pytest.param(
+            {"category": "transport", "subcategory": "car", "fuel_type": "kerosine"},
+            "No suitable emission factor found in database. Please adapt your query.",
+            id="not found",
+        ),
+        pytest.param(
+            {"category": "transport", "subcategory": "car", "fuel_type": "cng"},
+            "3 emission factors found. Please provide more specific selection criteria.",
+            id="ambiguous",
+        ),
+    ],
+)
+def test_get_emission_factor_errors(parameters, message):
+    """Test if missing and ambiguous emission factors raise an error"""
+    with pytest.raises(EmissionFactorNotFound) as e:
+        emission_factors.get(parameters)
+    assert e.value.message.startswith(message)
+
+
+def test_get_many_emission_factors():
+    """Test if factors of many queries are resolved in one call"""
+    parameters = pd.DataFrame(
+        {
+            "subcategory": ["car", "bus", "car", "car", "train"],
+            "fuel_type": ["diesel", "electric", "cng", "diesel", None],
+            "size": ["small", "average", None, "small", None],
+            "vehicle_range": [None, "local", None, None, "local"],
+            "passengers": [1, 1, 1, 3, 1],
+        }
+    )
+    factors, status = emission_factors.get_many(parameters, category="transport")
+
+    assert np.allclose(factors, [0.1109, 0.0296, np.nan, 0.1109, 0.008], equal_nan=True)
+    assert status.tolist() == [
+        FactorStatus.FOUND,
+        FactorStatus.FOUND,
+        FactorStatus.AMBIGUOUS,
+        FactorStatus.FOUND,
+        FactorStatus.FOUND,
+    ]
+
+
+def test_get_many_matches_get():
+    """Test if the bulk lookup returns the same factors as single lookups"""
+    parameters = {
+        "category": ["electricity", "electricity", "heating"],
+        "fuel_type": ["production fuel mix", "residual fuel mix", "gas"],
+        "country_code": ["DE", "XX", "global"],
+    }
+    factors, status = emission_factors.get_many(parameters)
+
+    assert factors[0] == emission_factors.get(
+        {
+            "category": "electricity",
+            "fuel_type": "production fuel mix",
+            "country_code": "DE",
+        }
+    )
+    assert factors[2] == emission_factors.get(
+        {"category": "heating", "fuel_type": "gas", "country_code": "global"}
+    )
+    assert np.isnan(factors[1])
+    assert status[1] == FactorStatus.NOT_FOUND
+
+
+def test_get_not_found_diagnosis(mocker):
+    """Test if a failed lookup names the conflicting parameter and its valid values"""
+    emission_factors = EmissionFactors()
+    parameters = {"category": "transport", "subcategory": "car", "size": "small"}
+    parameters["fuel_type"] = "hydrogen"
+
+    with pytest.raises(EmissionFactorNotFound) as error:
+        emission_factors.get(parameters)
+    assert error.value.parameter == "fuel_type"
+    assert "diesel" in error.value.suggestions
+    assert "hydrogen" not in error.value.suggestions
+    assert "fuel_type 'hydrogen'" in error.value.message
+    assert str(error.value) == error.value.message
+
+    # Repeated invalid queries are not diagnosed again
+    diagnose = mocker.spy(emission_factors._indexes["transport"], "diagnose")
+    with pytest.raises(EmissionFactorNotFound):
+        emission_factors.get(parameters)
+    diagnose.assert_not_called()
+
+
+def test_get_not_found_diagnosis_from_threads(mocker):
+    """Test if failed lookups from several threads are all diagnosed"""
+    mocker.patch.object(data_handlers, "MISS_CACHE_SIZE", 8)
+    emission_factors = EmissionFactors()
+
+    errors = []
+
+    def lookup(i):
+        try:
+            emission_factors.get({"category": "heating", "fuel_type": f"fuel {i}"})
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=lookup, args=(i,)) for i in range(200)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 200
+    assert all(isinstance(error, EmissionFactorNotFound) for error in errors)
+    assert len(emission_factors._misses) == 8
+
+
+def test_get_not_found_diagnosis_parameter_does_not_apply():
+    """Test if a failed lookup names a parameter which the nearest factors lack"""
+    emission_factors = EmissionFactors()
+    parameters = {
+        "category": "transport",
+        "subcategory": "train",
+        "fuel_type": "diesel",
+        "country_code": "DE",
+    }
+
+    with pytest.raises(EmissionFactorNotFound) as error:
+        emission_factors.get(parameters)
+    assert error.value.parameter == "fuel_type"
+    assert error.value.suggestions == ()
+    assert "fuel_type does not apply" in error.value.message
+    assert "Available values" not in error.value.message
+
+
+def test_factor_catalogue():
+    """Test if the catalogue holds the combinations with exactly one factor"""
+    catalogue = EmissionFactors().catalogues["transport"]
+    combination = dict(subcategory="car", fuel_type="diesel", size="small")
+
+    def key(**parameters):
+        return tuple(parameters.get(column) for column in catalogue.columns)
+
+    assert key(**combination, country_code="global") in catalogue.combinations
+    assert key(**combination, seating="average") not in catalogue.combinations
+    assert catalogue.options(subcategory="plane", seating="first_class")[
+        "vehicle_range"
+    ] == ["long-haul"]
+
+
+def test_tables_are_categorical():
+    """Test if text columns of the factor tables are stored as categoricals"""
+    emission_factors = EmissionFactors()
+    for column in ["country_code", "source", "name", "unit", "co2e_unit"]:
+        assert isinstance(emission_factors.transport[column].dtype, pd.CategoricalDtype)
+    assert emission_factors.transport["co2e"].dtype == np.float64
+
+
+def test_registry_loads_factors_on_first_use():
+    """Test if the registry loads the factor tables lazily and only once"""
+    registry = FactorRegistry()
+    assert registry._snapshot is None
+
+    assert isinstance(registry.emission_factors, EmissionFactors)
+    assert registry.emission_factors is registry.emission_factors
+
+
+def test_registry_watcher_survives_failed_reload(mocker):
+    """Test if the watcher keeps checking the data files after a reload failed"""
+    registry = FactorRegistry()
+    calls = threading.Semaphore(0)
+
+    def reload():
+        calls.release()
+        raise FileNotFoundError("emission_factors_transport.csv")
+
+    mocker.patch.object(registry, "reload", side_effect=reload)
+    with pytest.warns(RuntimeWarning, match="keeping the current"):
+        registry.watch(interval=0.01)
+        try:
+            assert calls.acquire(timeout=5) and calls.acquire(timeout=5)
+            assert registry._watcher.is_alive()
+        finally:
+            registry.stop_watching()
+
+
+def test_calculations_use_injected_registry(mocker):
+    """Test if calculations use the factors of an injected registry"""
+    injected_factors = EmissionFactors()
+    mocker.patch.object(injected_factors, "get", return_value=0.5)
+    previous = set_registry(FactorRegistry(emission_factors=injected_factors))
+    try:
+        co2e, co2e_factor, _ = mobility.calc_co2_car(distance=10)
+    finally:
+        set_registry(previous)
+
+    assert co2e_factor == 0.5
+    assert co2e == 5.0
+    assert get_registry() is previous
+
+
+@pytest.mark.parametrize(
+    "parameters,expected_factor,expected_fallbacks",
+    [
+        pytest.param(
+            {
+                "category": "transport",
+                "subcategory": "train",
+                "vehicle_range": "average",
+                "country_code": "FR",
+            },
+            0.0125,
+            (),
+            id="exact match",
+        ),
+        pytest.param(
+            {
+                "category": "transport",
+                "subcategory": "train",
+                "vehicle_range": "average",
+                "country_code": "PL",
+            },
+            0.007,
+            ("country_code",),
+            id="country to global",
+        ),
+        pytest.param(
+            {
+                "category": "transport",
+                "subcategory": "bus",
+                "fuel_type": "electric",
+                "size": "large",
+                "vehicle_range": "local",
+            },
+            0.0296,
+            ("size",),
+            id="size to average",
+        ),
+    ],
+)
+def test_resolve_emission_factor(parameters, expected_factor, expected_fallbacks):
+    """Test if emission factors are resolved with fallbacks"""
+    resolution = emission_factors.resolve(parameters)
+
+    assert resolution.factor == pytest.approx(expected_factor)
+    assert resolution.fallbacks == expected_fallbacks
+
+
+def test_resolve_unknown_value():
+    """Test if values which are not valid for their parameter do not fall back"""
+    with pytest.raises(EmissionFactorNotFound):
+        emission_factors.resolve(
+            {
+                "category": "transport",
+                "subcategory": "train",
+                "vehicle_range": "average",
+                "country_code": "XX",
+            }
+        )
+
+
+def test_resolve_ambiguous_emission_factor():
+    """Test if fallbacks are not used to resolve ambiguous queries"""
+    with pytest.raises(EmissionFactorNotFound):
+        emission_factors.resolve(
+            {"category": "transport", "subcategory": "car", "fuel_type": "cng"}
+        )
+
+
+def test_registry_reloads_changed_files(tmp_path):
+    """Test if the registry swaps in new tables only when the data files change"""
+    shutil.copytree(Path(script_path, "data"), tmp_path / "data")
+    registry = FactorRegistry(str(tmp_path), hash_content=True)
+    snapshot = registry.snapshot
+    parameters = {"category": "electricity", "fuel_type": "production fuel mix"}
+    parameters["country_code"] = "DE"
+
+    assert registry.reload() is False
+    assert registry.snapshot is snapshot
+
+    electricity = pd.read_csv(tmp_path / "data" / "emission_factors_electricity.csv")
+    electricity["co2e"] = 1.0
+    electricity.to_csv(
+        tmp_path / "data" / "emission_factors_electricity.csv", index=False
+    )
+    registry.reload_in_background().join()
+
+    assert registry.emission_factors.get(parameters) == 1.0
+    # The previous snapshot stays consistent for calculations in flight
+    assert snapshot.emission_factors.get(parameters) != 1.0
+
+
+def test_load_tables_from_snapshot(tmp_path, mocker):
+    """Test if the tables are loaded from the snapshot while it is up to date"""
+    shutil.copytree(Path(script_path, "data"), tmp_path / "data")
+    (tmp_path / "data" / "factors.snapshot").unlink(missing_ok=True)
+    parameters = {"category": "heating", "fuel_type": "coal"}
+
+    tables = load_tables(str(tmp_path))
+    assert (tmp_path / "data" / "factors.snapshot").exists()
+    read_csv = mocker.spy(pd, "read_csv")
+    assert load_tables(str(tmp_path))["emission_factors"].get(parameters) == tables[
+        "emission_factors"
+    ].get(parameters)
+    read_csv.assert_not_called()
+
+    # A stale snapshot is replaced by the content of the CSV files
+    heating = pd.read_csv(tmp_path / "data" / "emission_factors_heating.csv")
+    heating["co2e"] = 1.0
+    heating.to_csv(tmp_path / "data" / "emission_factors_heating.csv", index=False)
+    assert load_tables(str(tmp_path))["emission_factors"].get(parameters) == 1.0
+
+    # A corrupt snapshot is ignored
+    (tmp_path / "data" / "factors.snapshot").write_bytes(b"corrupt")
+    assert load_tables(str(tmp_path))["emission_factors"].get(parameters) == 1.0
+    # So is a snapshot of something else
+    (tmp_path / "data" / "factors.snapshot").write_bytes(pickle.dumps([1, 2]))
+    assert load_tables(str(tmp_path))["emission_factors"].get(parameters) == 1.0
+
+
+def test_load_tables_ignores_snapshot_of_other_environment(tmp_path, mocker):
+    """Test if a snapshot compiled with other library versions is not used"""
+    shutil.copytree(Path(script_path, "data"), tmp_path / "data")
+    load_tables(str(tmp_path))
+    mocker.patch(
+        "co2calculator.data_handlers._snapshot_environment",
+        return_value=("3.11.0", "1.0.0", "1.0.0"),
+    )
+    compile_snapshot = mocker.spy(data_handlers, "compile_snapshot")
+    load_tables(str(tmp_path))
+    compile_snapshot.assert_called_once()
+
+
+def test_load_tables_ignores_snapshot_of_other_source(tmp_path, mocker):
+    """Test if a snapshot compiled by other code of the table classes is not used"""
+    shutil.copytree(Path(script_path, "data"), tmp_path / "data")
+    load_tables(str(tmp_path))
+    mocker.patch("co2calculator.data_handlers._source_hash", return_value="changed")
+    compile_snapshot = mocker.spy(data_handlers, "compile_snapshot")
+    load_tables(str(tmp_path))
+    compile_snapshot.assert_called_once()
+
+
+@pytest.fixture
+def versioned_emission_factors(tmp_path):
+    """Two versions of the emission factors, the later one with a new car factor"""
+    shutil.copytree(Path(script_path, "data"), tmp_path / "data")
+    transport = pd.read_csv(tmp_path / "data" / "emission_factors_transport.csv")
+    transport.loc[transport["subcategory"] == "car", "co2e"] = 0.1
+    transport.to_csv(tmp_path / "data" / "emission_factors_transport.csv", index=False)
+    return VersionedEmissionFactors(
+        {"2020-01-01": EmissionFactors(), "2023-01-01": str(tmp_path)}
+    )
+
+
+def test_versioned_emission_factors_as_of(versioned_emission_factors):
+    """Test if the version valid at a date is used"""
+    parameters = {"category": "transport", "subcategory": "car"}
+    parameters["fuel_type"] = parameters["size"] = "average"
+
+    assert versioned_emission_factors.get(parameters, "2022-12-31") == 0.1864
+    assert versioned_emission_factors.get(parameters, "2023-01-01") == 0.1
+    with pytest.raises(EmissionFactorNotFound):
+        versioned_emission_factors.get(parameters, "2019-06-30")
+
+
+def test_versioned_emission_factors_get_many(versioned_emission_factors):
+    """Test if queries of different dates are resolved with their versions"""
+    parameters = {
+        "subcategory": ["car", "car", "train", "car"],
+        "fuel_type": ["average", "average", None, "average"],
+        "size": ["average", "average", None, "average"],
+        "vehicle_range": [None, None, "local", None],
+    }
+    dates = ["2021-05-01", "2024-02-29", "2024-02-29", "2019-01-01"]
+    factors, status = versioned_emission_factors.get_many(
+        parameters, dates, category="transport"
+    )
+
+    assert np.allclose(factors, [0.1864, 0.1, 0.008, np.nan], equal_nan=True)
+    assert status[-1] == FactorStatus.NOT_FOUND
+
+
+def test_conversion_factors_with_unit():
+    """Test if conversion factor and unit are returned by one lookup"""
+    conversion_factors = ConversionFactors()
+
+    assert conversion_factors.get_with_unit(HeatingFuel.GAS) == (10.8, "m^3")
+    assert conversion_factors.get_with_unit("wood pellets") == (5.4, "kg")
+    assert conversion_factors.get_unit("oil") == "l"
+    with pytest.raises(ConversionFactorNotFound):
+        conversion_factors.get_with_unit("electricity")
+
+
+def test_conversion_factors_to_kwh():
+    """Test if arrays of consumption values are converted to kwh"""
+    conversion_factors = ConversionFactors()
+    consumption = np.array([100.0, 100.0, 100.0, 36.0])
+    fuel_types = [HeatingFuel.GAS, "oil", "coal", None]
+
+    kwh = conversion_factors.to_kwh(consumption[:3], fuel_types[:3])
+    assert np.allclose(kwh, [1080.0, 1060.0, 600.0])
+
+    units = ["m^3", Unit.KWH, "kg", "MJ"]
+    kwh = conversion_factors.to_kwh(consumption, fuel_types, units)
+    assert np.allclose(kwh, [1080.0, 100.0, 600.0, 10.0])
+
+    with pytest.raises(ConversionFactorNotFound):
+        conversion_factors.to_kwh(consumption, fuel_types, "l")
+    with pytest.raises(ConversionFactorNotFound):
+        conversion_factors.to_kwh(consumption, fuel_types)
+
+    # Fuel types are compared in lower case, and unknown ones are always rejected
+    assert np.allclose(conversion_factors.to_kwh([1], ["Oil"]), [10.6])
+    with pytest.raises(ConversionFactorNotFound):
+        conversion_factors.to_kwh([1], ["bogus"], Unit.KWH)
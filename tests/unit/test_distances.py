@@ -8,7 +8,7 @@ import numpy as np
 import pytest
 from dotenv import load_dotenv
 from pydantic import ValidationError
-from co2calculator.constants import RangeCategory
+from co2calculator.constants import FlightRange, RangeCategory
 
 import co2calculator
 import co2calculator.distances
@@ -36,6 +36,69 @@ def test_haversine():
     assert distance == pytest.approx(distance_expected, rel=0.01)
 
 
+def test_haversine_many():
+    """Test that haversine_many computes the distances of whole arrays at once"""
+    # FRA -> BCN, FRA -> FRA and a pair of antipodes
+    lat_start = np.array([50.0264, 50.0264, 0.0])
+    long_start = np.array([8.5431, 8.5431, 0.0])
+    lat_dest = np.array([41.2971, 50.0264, 0.0])
+    long_dest = np.array([2.07846, 8.5431, 180.0])
+
+    distances = co2calculator.distances.haversine_many(
+        lat_start, long_start, lat_dest, long_dest
+    )
+
+    assert distances.shape == (3,)
+    assert distances[0] == pytest.approx(
+        co2calculator.distances.haversine(50.0264, 8.5431, 41.2971, 2.07846)
+    )
+    assert distances[1] == 0
+    assert distances[2] == pytest.approx(np.pi * 6371)
+
+
+@pytest.mark.parametrize(
+    "lat,long",
+    [
+        pytest.param([10.0, 91.0], [0.0, 0.0], id="latitude"),
+        pytest.param([10.0, 0.0], [0.0, -181.0], id="longitude"),
+        pytest.param([np.nan, 0.0], [0.0, 0.0], id="nan"),
+    ],
+)
+def test_haversine_many_invalid_coordinates(lat, long):
+    """Test that a single invalid coordinate in an array raises an error"""
+    with pytest.raises(co2calculator.exceptions.InvalidCoordinateInput):
+        co2calculator.distances.haversine_many(lat, long, 0.0, 0.0)
+
+
+def test_distance_matrix():
+    """Test that the chunked distance matrix matches haversine_many"""
+    rng = np.random.default_rng(0)
+    lat_start, long_start = rng.uniform(-90, 90, 50), rng.uniform(-180, 180, 50)
+    lat_dest, long_dest = rng.uniform(-90, 90, 7), rng.uniform(-180, 180, 7)
+    expected = co2calculator.distances.haversine_many(
+        lat_start[:, None], long_start[:, None], lat_dest, long_dest
+    )
+
+    matrix = co2calculator.distances.distance_matrix(
+        lat_start, long_start, lat_dest, long_dest, chunk_size=20
+    )
+    assert matrix.shape == (50, 7)
+    assert np.allclose(matrix, expected)
+
+    matrix = co2calculator.distances.distance_matrix(
+        lat_start, long_start, lat_dest, long_dest, "train", dtype=np.float32
+    )
+    assert matrix.dtype == np.float32
+    assert np.allclose(matrix, 1.2 * expected)
+
+    nearest = co2calculator.distances.nearest_distances(
+        lat_start, long_start, lat_dest, long_dest, k=3, chunk_size=20
+    )
+    assert nearest.indices.shape == (50, 3)
+    assert np.array_equal(nearest.indices, np.argsort(expected, axis=1)[:, :3])
+    assert np.allclose(nearest.distances, np.sort(expected, axis=1)[:, :3])
+
+
 def test_geocoding_airport_pelias_FRA(mocker):
     """Test geocoding of airports using IATA code"""
     # Given parameters
@@ -166,6 +229,7 @@ def test_geocoding_train_stations():
         pytest.param(100, "bus", 150.0, id="Bus"),
         pytest.param(100, "plane", 195.0, id="Plane"),
         pytest.param(100, "car", 100.0, id="Car"),
+        pytest.param(100, "ferry", 100.0, id="Ferry"),
     ],
 )
 def test_apply_detour(
@@ -178,6 +242,15 @@ def test_apply_detour(
     assert distance_with_detour == expected_distance
 
 
+def test_apply_detours():
+    """Test if detours of many trips are applied at once with a single warning"""
+    modes = ["train", "bus", "plane", "car", "ferry", "spaceship"]
+    with pytest.warns(UserWarning) as record:
+        distances = co2calculator.distances.apply_detours(np.full(6, 100.0), modes)
+    assert len(record) == 1
+    assert distances.tolist() == [120.0, 150.0, 195.0, 100.0, 100.0, 100.0]
+
+
 @pytest.mark.parametrize(
     "start, dest, expected_distance, expected_ferry_distance, expect_warning",
     [
@@ -254,3 +327,68 @@ def test_range_categories_negative_distance():
     """
     with pytest.raises(ValueError):
         co2calculator.distances.range_categories(-20)
+
+
+def test_range_category_codes():
+    """Test if arrays of distances are categorized at once"""
+    distances = np.array([0, 500, 500.1, 1500, 3999, 4000, 4001, 12000])
+    codes = co2calculator.distances.range_category_codes(distances)
+    assert codes.tolist() == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert [RangeCategory.from_code(code) for code in codes[[0, 2, 4, 6]]] == list(
+        RangeCategory
+    )
+    with pytest.raises(ValueError):
+        co2calculator.distances.range_category_codes(np.array([100, -1]))
+
+
+def test_get_leg_distances_plane_with_via():
+    """Test if the legs of a flight with stopover are computed at once"""
+    request = co2calculator.distances.create_distance_request(
+        {"address_type": "airport", "IATA": "FRA"},
+        {"address_type": "airport", "IATA": "BCN"},
+        "plane",
+        via=[{"address_type": "airport", "IATA": "MUC"}],
+    )
+    assert [location.iata_code for location in request.locations] == [
+        "FRA",
+        "MUC",
+        "BCN",
+    ]
+
+    distances, coords = co2calculator.distances.get_leg_distances(request)
+
+    points = np.array(coords)
+    expected = [
+        co2calculator.distances.haversine(*points[i, ::-1], *points[i + 1, ::-1]) + 95
+        for i in range(2)
+    ]
+    assert len(coords) == 3
+    assert distances == pytest.approx(expected)
+    distance, _ = co2calculator.distances.get_distance(request)
+    assert distance == pytest.approx(sum(expected))
+
+
+def test_get_leg_distances_car_with_via(mocker):
+    """Test if a car trip with via points is routed in a single request"""
+    coords = [[8.67, 49.41], [8.47, 49.49], [8.68, 50.11]]
+    mocker.patch(
+        "co2calculator.distances.geocoding_structured",
+        side_effect=[(None, None, c, None) for c in coords],
+    )
+    mocker.patch("co2calculator.distances.get_ors_client")
+    directions = mocker.patch(
+        "co2calculator.distances.directions",
+        return_value={
+            "routes": [{"segments": [{"distance": 21000.0}, {"distance": 89500.0}]}]
+        },
+    )
+    request = co2calculator.distances.create_distance_request(
+        "Heidelberg", "Frankfurt", "car", via=["Mannheim"]
+    )
+
+    distances, res_coords = co2calculator.distances.get_leg_distances(request)
+
+    assert directions.call_count == 1
+    assert directions.call_args.args[1] == coords
+    assert distances.tolist() == [21.0, 89.5]
+    assert res_coords == coords
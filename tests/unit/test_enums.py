@@ -2,9 +2,41 @@
 # -*- coding: utf-8 -*-
 """Test enums"""
 
-from co2calculator import HeatingFuel
+import pytest
+
+from co2calculator import (
+    CountryCode2,
+    CountryCode3,
+    HeatingFuel,
+    TransportationMode,
+    canonical_country_code,
+)
 
 
 def test_heatingfuel():
     """Test if HeatingFuel enum returns the same value as in the csv file"""
     assert HeatingFuel.OIL.value == "oil"
+
+
+def test_enum_codes():
+    """Test if enum members have integer codes in their order of definition"""
+    assert [mode.code for mode in TransportationMode] == list(
+        range(len(TransportationMode))
+    )
+    assert TransportationMode.from_code(TransportationMode.TRAIN.code) == "train"
+
+
+@pytest.mark.parametrize("country", ["DE", "de", "DEU", "Germany", " germany "])
+def test_canonical_country_code(country):
+    """Test if country codes and names of any case are mapped to the alpha-2 code"""
+    assert canonical_country_code(country) == "DE"
+
+
+def test_country_code_validation():
+    """Test if country codes are validated case-insensitively and upper-cased"""
+    assert CountryCode2.validate_country_code("fr") == "FR"
+    assert CountryCode3.validate_country_code("fra") == "FRA"
+    with pytest.raises(ValueError):
+        CountryCode2.validate_country_code("FRA")
+    with pytest.raises(ValueError):
+        canonical_country_code("Atlantis")
@@ -2,16 +2,27 @@
 # -*- coding: utf-8 -*-
 """Test pydantic models in parameters.py"""
 
+import gc
+import weakref
 from pathlib import Path
 from co2calculator import TransportationMode
+from co2calculator.constants import CarFuel, Size
 from co2calculator.data_handlers import EmissionFactors
 from co2calculator.parameters import (
     PlaneEmissionParameters,
     HeatingEmissionParameters,
     ElectricityEmissionParameters,
     CarEmissionParameters,
+    BusEmissionParameters,
+    CarEmissionRecord,
+    clear_parameter_cache,
+    parameter_cache_info,
+    parse_with_factor,
+    validate_many,
 )
 from co2calculator import emission_factors
+import numpy as np
+import pandas as pd
 import pytest
 from pydantic import ValidationError
 
@@ -46,3 +57,88 @@ def test_emission_factors_car() -> None:
 
     with pytest.raises(ValidationError):
         CarEmissionParameters(size=size)
+
+
+def test_parse_with_factor_cache() -> None:
+    """Test if repeated options are validated and looked up only once"""
+    clear_parameter_cache()
+    options = {"fuel_type": "diesel", "size": "small"}
+
+    params, co2e_factor = parse_with_factor(CarEmissionParameters, options)
+    cached_params, cached_factor = parse_with_factor(CarEmissionParameters, options)
+
+    assert co2e_factor == cached_factor == pytest.approx(0.1109)
+    # Records are immutable, so the cached record is shared
+    assert cached_params is params
+    assert parameter_cache_info().hits == 1
+    assert parameter_cache_info().misses == 1
+
+    # Options which the model treats alike share an entry
+    parse_with_factor(CarEmissionParameters, {"fuel_type": "Diesel", "size": "small"})
+    parse_with_factor(
+        CarEmissionParameters, {"fuel_type": CarFuel.DIESEL, "size": Size.SMALL}
+    )
+    assert parameter_cache_info().hits == 3
+    assert parameter_cache_info().misses == 1
+
+    # Other emission factors are looked up anew, and not kept alive by the cache
+    emission_factors = EmissionFactors()
+    parse_with_factor(CarEmissionParameters, options, emission_factors)
+    assert parameter_cache_info().misses == 2
+    reference = weakref.ref(emission_factors)
+    del emission_factors
+    gc.collect()
+    assert reference() is None
+
+
+def test_validate_many_bus() -> None:
+    """Test if a table of bus parameters is validated with the rules of the model"""
+    parameters = pd.DataFrame(
+        {
+            "fuel_type": ["electric", "electric", "cng", "kerosine", None],
+            "size": ["average", "large", "small", "small", "large"],
+            "vehicle_range": ["local", "local", "long-distance", "local", None],
+        }
+    )
+    validation = validate_many(BusEmissionParameters, parameters)
+
+    assert validation.invalid.tolist() == [False, True, True, True, False]
+    assert validation.messages[0] is None
+    assert "'electric'" in validation.messages[1]
+    assert "'cng'" in validation.messages[2]
+    assert "'kerosine'" in validation.messages[3]
+    # Missing values take the defaults of the model
+    assert validation.parameters["fuel_type"][4] == "diesel"
+    assert validation.parameters["vehicle_range"][4] == "long-distance"
+
+    # Each row is valid exactly if the model accepts it
+    for row, invalid in zip(parameters.to_dict("records"), validation.invalid):
+        options = {k: v for k, v in row.items() if v is not None}
+        try:
+            BusEmissionParameters.parse_obj(options)
+            assert not invalid
+        except ValidationError:
+            assert invalid
+
+
+def test_validate_many_invalid_column() -> None:
+    """Test if parameters which are not allowed invalidate all rows"""
+    validation = validate_many(CarEmissionParameters, {"seating": ["average"] * 2})
+    assert np.all(validation.invalid)
+
+
+def test_parameter_records() -> None:
+    """Test if validated parameters are held in immutable, hashable records"""
+    params, _ = parse_with_factor(CarEmissionParameters, {"fuel_type": "diesel"})
+
+    assert isinstance(params, CarEmissionRecord)
+    assert params.fuel_type == "diesel" and params.passengers == 1
+    assert hash(params) == hash(CarEmissionRecord(*params))
+    assert not hasattr(params, "__dict__")
+    with pytest.raises(AttributeError):
+        params.passengers = 2
+
+    model = params.to_model()
+    assert isinstance(model, CarEmissionParameters)
+    assert model.dict() == params.dict()
+    assert CarEmissionRecord.from_model(model) == params
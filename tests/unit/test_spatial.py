@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Test spatial indexes"""
+
+import numpy as np
+import pytest
+
+from co2calculator.distances import nearest_distances
+from co2calculator.exceptions import InvalidCoordinateInput
+from co2calculator.spatial import SphericalIndex
+
+
+@pytest.fixture
+def points():
+    # Clustered points, as well as points near the poles and the date line
+    rng = np.random.default_rng(0)
+    lat = np.concatenate(
+        [rng.uniform(45, 55, 300), rng.uniform(-90, 90, 200), [89.9, -89.9]]
+    )
+    long = np.concatenate(
+        [rng.uniform(0, 15, 300), rng.uniform(-180, 180, 200), [0.0, 179.9]]
+    )
+    return lat, long
+
+
+@pytest.mark.parametrize("k", [1, 4])
+def test_spherical_index_is_exact(points, k):
+    """Test if the index finds the same neighbours as comparing all distances"""
+    rng = np.random.default_rng(1)
+    lat = np.concatenate([rng.uniform(-90, 90, 500), [90.0, -90.0, 50.0]])
+    long = np.concatenate([rng.uniform(-180, 180, 500), [0.0, 0.0, -180.0]])
+    index = SphericalIndex(*points, cell_size=1.0)
+
+    nearest = index.query(lat, long, k)
+
+    expected = nearest_distances(lat, long, *points, k)
+    assert nearest.indices.shape == (len(lat), k)
+    assert np.array_equal(nearest.indices, expected.indices)
+    assert np.allclose(nearest.distances, expected.distances)
+
+
+def test_spherical_index_query_more_than_points(points):
+    """Test if k is limited to the number of points"""
+    index = SphericalIndex(points[0][:3], points[1][:3])
+    nearest = index.query(0.0, 0.0, k=10)
+    assert nearest.indices.shape == (1, 3)
+    assert len(index) == 3
+
+
+def test_spherical_index_invalid_input(points):
+    """Test if invalid coordinates and parameters are rejected"""
+    index = SphericalIndex(*points)
+    with pytest.raises(InvalidCoordinateInput):
+        index.query([10.0, 95.0], [0.0, 0.0])
+    with pytest.raises(ValueError):
+        index.query(10.0, 0.0, k=0)
+    with pytest.raises(ValueError):
+        SphericalIndex([], [])
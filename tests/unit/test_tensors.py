@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Test factor tensors"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from co2calculator import emission_factors
+from co2calculator.constants import (
+    COUNTRY_CODES,
+    CarFuel,
+    BusFuel,
+    BusTrainRange,
+    Size,
+    TransportationMode,
+)
+from co2calculator.data_handlers import FactorStatus
+from co2calculator.tensors import AXES, FactorTensor
+
+
+@pytest.fixture
+def transport_tensor():
+    return emission_factors.tensor("transport")
+
+
+def test_gather_factor_by_codes(transport_tensor):
+    """Test if a factor is gathered from the enum codes of its parameters"""
+    factor = transport_tensor[
+        TransportationMode.CAR.code, CarFuel.DIESEL.code, Size.SMALL.code
+    ]
+    assert factor == emission_factors.get(
+        {
+            "category": "transport",
+            "subcategory": "car",
+            "fuel_type": "diesel",
+            "size": "small",
+        }
+    )
+
+
+def test_lookup_code_arrays(transport_tensor):
+    """Test if arrays of codes are resolved element-wise"""
+    factors, status = transport_tensor.lookup(
+        subcategory=np.array(
+            [TransportationMode.BUS.code, TransportationMode.TRAIN.code]
+        ),
+        fuel_type=np.array([BusFuel.ELECTRIC.code, -1]),
+        vehicle_range=BusTrainRange.LOCAL.code,
+        country_code=COUNTRY_CODES.index("global"),
+    )
+    assert np.allclose(factors, [0.0296, 0.008])
+    assert status.tolist() == [FactorStatus.FOUND, FactorStatus.FOUND]
+
+
+def test_tensor_matches_get_many(transport_tensor):
+    """Test if the tensor finds the same factors as the table lookup"""
+    parameters = pd.DataFrame(
+        {
+            "subcategory": ["car", "car", "plane", "train", "bus"],
+            "fuel_type": ["diesel", "cng", None, None, "hydrogen"],
+            "vehicle_range": [None, None, "long-haul", "average", None],
+            "seating": [None, None, "first_class", None, None],
+            "country_code": [None, None, None, "FR", None],
+        }
+    )
+    factors, status = transport_tensor.lookup(**transport_tensor.encode(parameters))
+    expected_factors, expected_status = emission_factors.get_many(
+        parameters, category="transport"
+    )
+
+    assert np.allclose(factors, expected_factors, equal_nan=True)
+    assert np.array_equal(status, expected_status)
+
+
+@pytest.mark.parametrize("category", list(AXES))
+def test_tensor_matches_get_many_for_all_table_values(category):
+    """Test if the tensor finds the same factors as the table lookup for every
+    combination of the values of the table (and parameters not given)"""
+    table = emission_factors.databases[category]
+    columns = [axis.column for axis in AXES[category]]
+    groups = [({}, table)]
+    if columns[0] == "subcategory":
+        columns = columns[1:]
+        groups = [
+            ({"subcategory": mode}, group)
+            for mode, group in table.groupby("subcategory", observed=True)
+        ]
+    rows = []
+    for given, group in groups:
+        values = [[None, *group[column].dropna().unique()] for column in columns]
+        for combination in itertools.product(*values):
+            rows.append(dict(zip(columns, combination), **given))
+    parameters = pd.DataFrame(rows)
+    tensor = emission_factors.tensor(category)
+
+    factors, status = tensor.lookup(**tensor.encode(parameters))
+    expected_factors, expected_status = emission_factors.get_many(parameters, category)
+
+    assert np.allclose(factors, expected_factors, equal_nan=True)
+    assert np.array_equal(status, expected_status)
+
+
+def test_tensor_without_mode(transport_tensor):
+    """Test if queries without transportation mode match the table lookup, unless
+    they give a fuel type or range, whose codes depend on the mode"""
+    parameters = pd.DataFrame(
+        {
+            "size": ["small", "average", None],
+            "seating": [None, None, "first_class"],
+            "country_code": ["global", None, None],
+        }
+    )
+    factors, status = transport_tensor.lookup(**transport_tensor.encode(parameters))
+    expected_factors, expected_status = emission_factors.get_many(
+        parameters, category="transport"
+    )
+    assert np.allclose(factors, expected_factors, equal_nan=True)
+    assert np.array_equal(status, expected_status)
+
+    parameters = {"fuel_type": ["cng"], "size": ["small"], "vehicle_range": ["local"]}
+    with pytest.raises(ValueError, match="subcategory"):
+        transport_tensor.lookup(**transport_tensor.encode(parameters))
+
+
+def test_tensor_rejects_values_without_code():
+    """Test if compiling a table fails for values which have no code"""
+    table = emission_factors.databases["heating"].astype(object).copy()
+    table.loc[table.index[0], "fuel_type"] = "peat"
+    with pytest.raises(ValueError, match="peat"):
+        FactorTensor(table, AXES["heating"])